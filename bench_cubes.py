@@ -0,0 +1,121 @@
+from time import perf_counter
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+import cubes
+
+# face kinds are added in this order, so every workload is the one before it plus a kind or two
+KIND_ORDER = ("Empty", "Triangle", "Square", "Round", "TipLeft", "TipRight", "HalfSquare", "BaseLeft", "BaseRight", "HalfTriangle", "InvertedHalfTriangle")
+
+def makeKinds(size: int, specialTri: bool) -> list:
+    return cubes.Ruleset(specialTri).kinds([getattr(cubes, name) for name in KIND_ORDER[:size]])
+
+def measure(func, repeat: int) -> dict:
+    # best of repeat untraced runs for the time, then one traced run for the peak memory
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    count = result if isinstance(result, int) else len(result)
+    return {"seconds": best, "peak_bytes": peak, "count": count}
+
+def stageWorkloads(facekinds: list) -> dict:
+    # recursiveEdgeCheck (through buildStage) and cullCubes timed separately for each layer of the staged build
+    runs = {}
+    index = cubes.SharedEdgeIndex(facekinds)
+    cubeList = [cubes.CubeState().with_face("bottom", face) for face in facekinds]
+    for newestFace, connectedFaces in cubes.STAGES:
+        built = cubes.buildStage(cubeList, facekinds, newestFace, connectedFaces, index)
+        runs["build_" + newestFace] = lambda cubeList=cubeList, newestFace=newestFace, connectedFaces=connectedFaces: cubes.buildStage(cubeList, facekinds, newestFace, connectedFaces, index)
+        runs["cull_" + newestFace] = lambda built=built: cubes.cullCubes(built)
+        cubeList = cubes.cullCubes(built)
+    return runs
+
+def cubeWorkloads(facekinds: list) -> dict:
+    # Cube.__eq__ over every pair of finished cubes, and each rotation method over every cube
+    catalog = [cube.to_cube() for cube in cubes.enumerateCubes(facekinds)]
+    runs = {"eq": lambda: [a == b for a in catalog for b in catalog]}
+    for name in ("rotate_top_face_90", "bottom_to_top", "front_to_top", "back_to_top", "left_to_top", "right_to_top"):
+        runs[name] = lambda name=name: [getattr(cube, name)() for cube in catalog]
+    return runs
+
+def endToEndWorkloads(facekinds: list) -> dict:
+    return {"staged": lambda: cubes.stagedCubes(facekinds),
+            "search": lambda: cubes.enumerateCubes(facekinds, orderly=False),
+            "orderly": lambda: cubes.enumerateCubes(facekinds),
+            "count": lambda: cubes.count_cubes(facekinds)}
+
+def runSuite(sizes: list, repeat: int) -> dict:
+    results = {}
+    for specialTri in (True, False):
+        for size in sizes:
+            facekinds = makeKinds(size, specialTri)
+            workload = "kinds=%d specialtri=%s" % (size, specialTri)
+            runs = {}
+            runs.update(stageWorkloads(facekinds))
+            runs.update(cubeWorkloads(facekinds))
+            runs.update(endToEndWorkloads(facekinds))
+            for name, func in runs.items():
+                result = results[workload + " " + name] = measure(func, repeat)
+                print("%-44s %10.4fs %10.1fKiB %8d" % (workload + " " + name, result["seconds"], result["peak_bytes"] / 1024, result["count"]))
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float, slack: float, slackBytes: int) -> list:
+    # a result count that moved is always a failure; time and memory only fail past the tolerance,
+    # and also need to be slack seconds (or slackBytes) over, so noise on the tiny workloads is not flagged
+    # a baseline without seconds or peak_bytes (like the committed one, which only has the counts, as those
+    # are the same on every machine) just isn't compared on them
+    problems = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result["count"] != old["count"]:
+            problems.append("%s: count %d, baseline %d" % (name, result["count"], old["count"]))
+        if "seconds" in old and result["seconds"] > old["seconds"] * (1 + tolerance) and result["seconds"] - old["seconds"] > slack:
+            problems.append("%s: seconds %.4g, baseline %.4g" % (name, result["seconds"], old["seconds"]))
+        if "peak_bytes" in old and result["peak_bytes"] > old["peak_bytes"] * (1 + tolerance) and result["peak_bytes"] - old["peak_bytes"] > slackBytes:
+            problems.append("%s: peak_bytes %d, baseline %d" % (name, result["peak_bytes"], old["peak_bytes"]))
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the enumeration stages, dedup and rotation across growing face kind sets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 5, 7], help="how many face kinds (taken in KIND_ORDER) each workload uses")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per timing, the fastest is kept")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="stored results to compare against (the committed one only has the counts; save your own for timings)")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run's results as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="how much slower or bigger than the baseline a run may be")
+    parser.add_argument("--slack", type=float, default=0.01, help="seconds a timing may grow by regardless of the tolerance")
+    parser.add_argument("--slack-kib", type=int, default=256, help="KiB a peak may grow by regardless of the tolerance")
+    args = parser.parse_args()
+
+    results = runSuite(args.sizes, args.repeat)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print("saved", args.baseline)
+    else:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print("no baseline at", args.baseline, "- run with --save-baseline first")
+            sys.exit(1)
+        problems = compare(results, baseline, args.tolerance, args.slack, args.slack_kib * 1024)
+        for problem in problems:
+            print("REGRESSION", problem)
+        if problems:
+            sys.exit(1)
+        print("no regressions against", args.baseline)
@@ -1,9 +1,97 @@
 from enum import Enum
 from collections import Counter
-import copy
+from operator import itemgetter
+from itertools import permutations, product
+from time import perf_counter
+import argparse
+import asyncio
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import socket
+import struct
+import sys
 
-# Triangle (and Round) faces can have one otherwise FULL edge touch an otherwise VOID edge
-SPECIALTRI_IS_LEGAL = True
+try:
+    import numpy
+except ImportError:
+    # only Catalog.array and BatchValidator need it
+    numpy = None
+
+class Ruleset():
+    # a variant of the building rules; face kinds are made under one (FaceKind(ruleset)), and whatever they
+    # are enumerated, counted or cached with follows from theirs
+    # specialTri: Triangle (and Round) faces can have one otherwise FULL edge touch an otherwise VOID edge
+    __slots__ = ("specialTri",)
+    def __init__(self, specialTri: bool = True) -> None:
+        self.specialTri = specialTri
+    def __repr__(self) -> str:
+        return "Ruleset(specialTri=%r)" % self.specialTri
+    def __eq__(self, obj: object) -> bool:
+        return isinstance(obj, Ruleset) and self.key() == obj.key()
+    def __ne__(self, obj: object) -> bool:
+        return not self == obj
+    def __hash__(self) -> int:
+        return hash(tuple(self.key().items()))
+    def key(self) -> dict:
+        return {"specialTri": self.specialTri}
+    def specialEdges(self) -> list:
+        # edges that may only join an Empty face to a face of another kind
+        specialChecks = [Edge.SPECIALFULL]
+        if self.specialTri:
+            specialChecks.append(Edge.SPECIALTRI)
+        return specialChecks
+    def kinds(self, kindClasses: list) -> list:
+        return [kindClass(self) for kindClass in kindClasses]
+
+# the rules face kinds get when none is given
+RULESET = Ruleset()
+
+# the Profile being filled in, if any; every hook checks this first, so a run without one only pays for that check
+PROFILE = None
+
+class Profile():
+    # per-stage counters for one run: install with `with Profile() as profile:` and read profile.report()
+    # stages are the face being placed (bottom, back, ...), plus dedup for the search engine's duplicate check
+    # counters: generated candidates, rejected (failed face checks), pruned (orderly branches cut),
+    # duplicates (removed by dedup), eq_calls (Cube.__eq__), rotations (orientations built or encoded),
+    # and build_seconds / cull_seconds for the staged pipeline
+    __slots__ = ("stages", "stage", "seconds", "start")
+    def __init__(self) -> None:
+        self.stages = {}
+        self.stage = "other"
+        self.seconds = 0.0
+        self.start = None
+    def begin(self) -> None:
+        global PROFILE
+        PROFILE = self
+        self.start = perf_counter()
+    def end(self) -> None:
+        global PROFILE
+        PROFILE = None
+        self.seconds += perf_counter() - self.start
+    def __enter__(self):
+        self.begin()
+        return self
+    def __exit__(self, *exc) -> bool:
+        self.end()
+        return False
+    def count(self, name: str, n=1, stage: str = None) -> None:
+        # stage defaults to the one last set, for hooks that can't tell which stage called them
+        stage = self.stage if stage is None else stage
+        counters = self.stages.get(stage)
+        if counters is None:
+            counters = self.stages[stage] = Counter()
+        counters[name] += n
+    def report(self) -> dict:
+        totals = Counter()
+        for counters in self.stages.values():
+            totals.update(counters)
+        return {"seconds": self.seconds, "stages": {stage: dict(counters) for stage, counters in self.stages.items()}, "totals": dict(totals)}
+    def to_json(self) -> str:
+        return json.dumps(self.report(), indent=1)
 
 class Edge(Enum):
     VOID = 0
@@ -18,22 +106,54 @@ class Edge(Enum):
 
     SPECIALTRI = 6
 
+# a face's sides go a, b, c, d: a at the top, b on the left, c on the right, d at the bottom
+# for each side, the index of the side across from it, and of its neighbours to the left and right
+# when that side is turned to the bottom
+OPPOSITE_SIDE = (3, 2, 1, 0)
+LEFT_SIDE = (2, 0, 3, 1)
+RIGHT_SIDE = (1, 3, 0, 2)
+
+def sidesMatch(sides: tuple, edges: tuple, toward: tuple, allowed: tuple) -> bool:
+    # every side holding one of edges has one of allowed on its toward[i] side
+    for i, edge in enumerate(sides):
+        if edge in edges and sides[toward[i]] not in allowed:
+            return False
+    return True
+
 class FaceKind(object):
-    def __init__(self) -> None:
+    # stable integer identifying the kind when a cube is encoded as plain ints
+    kind_id = 0
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        self.ruleset = RULESET if ruleset is None else ruleset
         self.name = ''
         self.budget = []
+        self._legalSides = None
     def __str__(self) -> str:
         return "Face"
     def __eq__(self, obj: object) -> bool:
         return type(self) == type(obj)
     def __ne__(self, obj: object) -> bool:
         return not self == obj
+    def __hash__(self) -> int:
+        return hash(type(self))
     def orientationCheck(self, a, b, c, d) -> bool:
         return True
+    def legalSides(self) -> frozenset:
+        # compiled on first use: every (a, b, c, d) drawn from the budget that orientationCheck allows,
+        # plus each of those with some sides still None, so partly built faces are checked by lookup too
+        if self._legalSides is None:
+            legal = set()
+            for sides in set(permutations(self.budget, 4)):
+                if self.orientationCheck(*sides):
+                    for hidden in product((False, True), repeat=4):
+                        legal.add(tuple(None if hide else edge for edge, hide in zip(sides, hidden)))
+            self._legalSides = frozenset(legal)
+        return self._legalSides
 
 class Square(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 2
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += 4 * [Edge.FULL]
         self.budget += 2 * [Edge.SPECIALFULL]
     def __str__(self) -> str:
@@ -47,11 +167,12 @@ class Square(FaceKind):
         return True
 
 class Empty(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 1
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += 4 * [Edge.VOID]
         self.budget += 2 * [Edge.SPECIALFULL]
-        if SPECIALTRI_IS_LEGAL:
+        if self.ruleset.specialTri:
             self.budget += [Edge.SPECIALTRI]
     def __str__(self) -> str:
         return "Empty"
@@ -61,7 +182,7 @@ class Empty(FaceKind):
             return False
         elif b == Edge.SPECIALFULL and c == Edge.SPECIALFULL:
             return False
-        if SPECIALTRI_IS_LEGAL:
+        if self.ruleset.specialTri:
             # cannot contain SPECIALFULL and SPECIALTRI at the same time
             if Edge.SPECIALFULL in [a,b,c,d] and Edge.SPECIALTRI in [a,b,c,d]:
                 return False
@@ -69,11 +190,12 @@ class Empty(FaceKind):
         return True
 
 class Triangle(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 3
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += 2 * [Edge.FULL]
         self.budget += 2 * [Edge.VOID]
-        if SPECIALTRI_IS_LEGAL:
+        if self.ruleset.specialTri:
             self.budget += [Edge.SPECIALTRI]
     def __str__(self) -> str:
         return "Triangle"
@@ -84,15 +206,16 @@ class Triangle(FaceKind):
             return False
         elif b is not None and c is not None and b == c:
             return False
-        if SPECIALTRI_IS_LEGAL:
+        if self.ruleset.specialTri:
             # SPECIALTRI must take the place of a FULL and hence cannot be opposite of a FULL
             if (Edge.SPECIALTRI in (a,d) and Edge.FULL in (a,d)) or (Edge.SPECIALTRI in (b,c) and Edge.FULL in (b,c)):
                 return False
         return True
     
 class HalfSquare(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 4
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += [Edge.FULL]
         self.budget += [Edge.VOID]
         self.budget += [Edge.HALF_LEFT]
@@ -101,28 +224,46 @@ class HalfSquare(FaceKind):
     def __str__(self) -> str:
         return "HalfSquare"
     def orientationCheck(self, a: Edge, b: Edge, c: Edge, d: Edge) -> bool:
+        sides = (a, b, c, d)
         # void must be opposite full
-        # left and right must be opposite
+        if not sidesMatch(sides, (Edge.VOID,), OPPOSITE_SIDE, (Edge.FULL,)):
+            return False
+        # left and right must be opposite (or opposite the special half standing in for the other)
+        if not sidesMatch(sides, (Edge.HALF_LEFT,), OPPOSITE_SIDE, (Edge.HALF_RIGHT, Edge.SPECIALHALF)):
+            return False
+        if not sidesMatch(sides, (Edge.HALF_RIGHT,), OPPOSITE_SIDE, (Edge.HALF_LEFT, Edge.SPECIALHALF)):
+            return False
         # left must be left of full, right must be right of full
+        if not sidesMatch(sides, (Edge.HALF_LEFT,), RIGHT_SIDE, (Edge.FULL,)):
+            return False
+        if not sidesMatch(sides, (Edge.HALF_RIGHT,), LEFT_SIDE, (Edge.FULL,)):
+            return False
         # special must be opposite another half
-        pass
+        return sidesMatch(sides, (Edge.SPECIALHALF,), OPPOSITE_SIDE, (Edge.HALF_LEFT, Edge.HALF_RIGHT))
 
 class HalfTriangle(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 5
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += 2 * [Edge.VOID]
         self.budget += [Edge.HALF_LEFT]
         self.budget += [Edge.HALF_RIGHT]
     def __str__(self) -> str:
         return "HalfTriangle"
     def orientationCheck(self, a: Edge, b: Edge, c: Edge, d: Edge) -> bool:
+        sides = (a, b, c, d)
         # halves must be opposite voids
+        if not sidesMatch(sides, (Edge.HALF_LEFT, Edge.HALF_RIGHT), OPPOSITE_SIDE, (Edge.VOID,)):
+            return False
         # left must be left of right, right must be right of left
-        pass
+        if not sidesMatch(sides, (Edge.HALF_LEFT,), RIGHT_SIDE, (Edge.HALF_RIGHT,)):
+            return False
+        return sidesMatch(sides, (Edge.HALF_RIGHT,), LEFT_SIDE, (Edge.HALF_LEFT,))
 
 class InvertedHalfTriangle(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 6
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += 2 * [Edge.FULL]
         self.budget += [Edge.HALF_LEFT]
         self.budget += [Edge.HALF_RIGHT]
@@ -130,13 +271,19 @@ class InvertedHalfTriangle(FaceKind):
     def __str__(self) -> str:
         return "InvertedHalfTriangle"
     def orientationCheck(self, a: Edge, b: Edge, c: Edge, d: Edge) -> bool:
+        sides = (a, b, c, d)
         # halves must be opposite fulls
+        if not sidesMatch(sides, (Edge.HALF_LEFT, Edge.HALF_RIGHT, Edge.SPECIALHALF), OPPOSITE_SIDE, (Edge.FULL,)):
+            return False
         # left must be right of right, right must be left of left
-        pass
+        if not sidesMatch(sides, (Edge.HALF_LEFT,), LEFT_SIDE, (Edge.HALF_RIGHT,)):
+            return False
+        return sidesMatch(sides, (Edge.HALF_RIGHT,), RIGHT_SIDE, (Edge.HALF_LEFT,))
 
 class TipLeft(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 7
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += [Edge.FULL]
         self.budget += 2 * [Edge.VOID]
         self.budget += [Edge.HALF_LEFT]
@@ -144,13 +291,17 @@ class TipLeft(FaceKind):
     def __str__(self) -> str:
         return "TipLeft"
     def orientationCheck(self, a: Edge, b: Edge, c: Edge, d: Edge) -> bool:
+        sides = (a, b, c, d)
         # voids must be opposite non-voids
+        if not sidesMatch(sides, (Edge.VOID,), OPPOSITE_SIDE, (Edge.FULL, Edge.HALF_LEFT, Edge.SPECIALHALF)):
+            return False
         # left must be left of full
-        pass
+        return sidesMatch(sides, (Edge.HALF_LEFT,), RIGHT_SIDE, (Edge.FULL,))
 
 class TipRight(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 8
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += [Edge.FULL]
         self.budget += 2 * [Edge.VOID]
         self.budget += [Edge.HALF_RIGHT]
@@ -158,27 +309,35 @@ class TipRight(FaceKind):
     def __str__(self) -> str:
         return "TipRight"
     def orientationCheck(self, a: Edge, b: Edge, c: Edge, d: Edge) -> bool:
+        sides = (a, b, c, d)
         # voids must be opposite non-voids
+        if not sidesMatch(sides, (Edge.VOID,), OPPOSITE_SIDE, (Edge.FULL, Edge.HALF_RIGHT, Edge.SPECIALHALF)):
+            return False
         # right must be right of full
-        pass
+        return sidesMatch(sides, (Edge.HALF_RIGHT,), LEFT_SIDE, (Edge.FULL,))
 
 class BaseLeft(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 9
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += 2 * [Edge.FULL]
         self.budget += [Edge.VOID]
         self.budget += [Edge.HALF_LEFT]
         self.budget += [Edge.SPECIALHALF]
     def __str__(self) -> str:
-        return "TipLeft"
+        return "BaseLeft"
     def orientationCheck(self, a: Edge, b: Edge, c: Edge, d: Edge) -> bool:
+        sides = (a, b, c, d)
         # fulls must be opposite non-fulls
+        if not sidesMatch(sides, (Edge.FULL,), OPPOSITE_SIDE, (Edge.VOID, Edge.HALF_LEFT, Edge.SPECIALHALF)):
+            return False
         # left must be left of full
-        pass
+        return sidesMatch(sides, (Edge.HALF_LEFT,), RIGHT_SIDE, (Edge.FULL,))
 
 class BaseRight(FaceKind):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 10
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
         self.budget += 2 * [Edge.FULL]
         self.budget += [Edge.VOID]
         self.budget += [Edge.HALF_RIGHT]
@@ -186,17 +345,22 @@ class BaseRight(FaceKind):
     def __str__(self) -> str:
         return "BaseRight"
     def orientationCheck(self, a: Edge, b: Edge, c: Edge, d: Edge) -> bool:
+        sides = (a, b, c, d)
         # fulls must be opposite non-fulls
+        if not sidesMatch(sides, (Edge.FULL,), OPPOSITE_SIDE, (Edge.VOID, Edge.HALF_RIGHT, Edge.SPECIALHALF)):
+            return False
         # right must be right of full
-        pass
+        return sidesMatch(sides, (Edge.HALF_RIGHT,), LEFT_SIDE, (Edge.FULL,))
 
 class Round(Triangle):
-    def __init__(self) -> None:
-        super().__init__()
+    kind_id = 11
+    def __init__(self, ruleset: Ruleset = None) -> None:
+        super().__init__(ruleset)
     def __str__(self) -> str:
         return "Round"
 
 class Face():
+    __slots__ = ("facekind", "a", "b", "c", "d", "remainingBudget")
     def __init__(self, facekind: FaceKind)-> None:
         self.facekind = facekind
         # a
@@ -224,9 +388,53 @@ class Face():
     def __ne__(self, obj: object) -> bool:
         return not self == obj
     def isOrientationOk(self) -> bool:
-        return self.facekind.orientationCheck(self.a, self.b, self.c, self.d)
+        return (self.a, self.b, self.c, self.d) in self.facekind.legalSides()
+
+# a cube's state is one flat tuple: the 6 faces in get_face_list order, then the 12 edges in get_edge_list order
+FACE_NAMES = ("top", "bottom", "front", "back", "left", "right")
+EDGE_NAMES = ("topBackEdge", "topLeftEdge", "topFrontEdge", "topRightEdge", "backLeftEdge", "backRightEdge", "frontLeftEdge", "frontRightEdge",
+              "bottomBackEdge", "bottomLeftEdge", "bottomFrontEdge", "bottomRightEdge")
+# the two faces (by position) each edge joins
+EDGE_FACES = ((0, 3), (0, 4), (0, 2), (0, 5), (3, 4), (3, 5), (2, 4), (2, 5), (1, 3), (1, 4), (1, 2), (1, 5))
+EDGE_BETWEEN = {}
+for edgeIndex, (x, y) in enumerate(EDGE_FACES):
+    EDGE_BETWEEN[(x, y)] = EDGE_BETWEEN[(y, x)] = edgeIndex
+# which edge sits on each side of a face, in Face's a, b, c, d order, every face seen from outside the cube
+# so that left and right mean the same thing on all six
+FACE_SIDES = ((0, 1, 3, 2), (8, 11, 9, 10), (2, 6, 7, 10), (0, 5, 4, 8), (1, 4, 6, 9), (3, 7, 5, 11))
+
+# a turn is a permutation of that state: slot i of the turned cube holds slot turn[i] of the original
+#                     faces               edges
+ROTATE_TOP_FACE_90 = (0, 1, 5, 4, 2, 3,  7, 8, 9, 6, 12, 10, 13, 11, 15, 16, 17, 14)
+BOTTOM_TO_TOP =      (1, 0, 3, 2, 4, 5,  16, 15, 14, 17, 12, 13, 10, 11, 8, 7, 6, 9)
+FRONT_TO_TOP =       (2, 3, 1, 0, 4, 5,  8, 12, 16, 13, 7, 9, 15, 17, 6, 10, 14, 11)
+BACK_TO_TOP =        (3, 2, 0, 1, 4, 5,  14, 10, 6, 11, 15, 17, 7, 9, 16, 12, 8, 13)
+LEFT_TO_TOP =        (4, 5, 2, 3, 1, 0,  10, 15, 12, 7, 14, 6, 16, 8, 11, 17, 13, 9)
+RIGHT_TO_TOP =       (5, 4, 2, 3, 0, 1,  11, 9, 13, 17, 6, 14, 8, 16, 10, 7, 12, 15)
+IDENTITY = tuple(range(18))
+
+def composeTurns(first: tuple, second: tuple) -> tuple:
+    # the turn that does first, then second
+    return tuple(first[i] for i in second)
+
+def buildOrientations() -> list:
+    # each face to the top, then each of its 4 rotations: the 24 rotations of the cube
+    orientations = []
+    for turn in [IDENTITY, BOTTOM_TO_TOP, FRONT_TO_TOP, BACK_TO_TOP, LEFT_TO_TOP, RIGHT_TO_TOP]:
+        for _ in range(4):
+            orientations.append(turn)
+            turn = composeTurns(turn, ROTATE_TOP_FACE_90)
+    return orientations
+
+ORIENTATIONS = buildOrientations()
+ORIENTATION_GETTERS = [itemgetter(*turn) for turn in ORIENTATIONS]
+
+def canonicalCode(code: tuple) -> tuple:
+    # smallest encoding over every orientation, so rotated copies of a cube share one key
+    return min(getter(code) for getter in ORIENTATION_GETTERS)
 
 class Cube():
+    __slots__ = ("top", "bottom", "front", "back", "left", "right") + EDGE_NAMES
     def __init__(self, top:Face=None, bottom:Face=None, front:Face=None, back:Face=None, left:Face=None, right:Face=None) -> None:
         self.top = top
         self.bottom = bottom
@@ -251,145 +459,63 @@ class Cube():
         self.bottomRightEdge = None
 
     def __eq__(self, obj: object) -> bool:
-        # unhashable
-        #if Counter(self.get_face_list()) != Counter(obj.get_face_list()):
-        #   return False
-        for cube in [obj, obj.bottom_to_top(), obj.front_to_top(), obj.back_to_top(), obj.left_to_top(), obj.right_to_top()]:
-            for rota in [cube, cube.rotate_top_face_90(), cube.rotate_top_face_90().rotate_top_face_90(), cube.rotate_top_face_90().rotate_top_face_90().rotate_top_face_90()]:
-                if self.get_face_list() == rota.get_face_list() and self.get_edge_list() == rota.get_edge_list():
-                    return True
+        if PROFILE is not None:
+            PROFILE.count("eq_calls")
+        state = self.get_state()
+        objState = obj.get_state()
+        for turns, getter in enumerate(ORIENTATION_GETTERS, 1):
+            if getter(objState) == state:
+                if PROFILE is not None:
+                    PROFILE.count("rotations", turns)
+                return True
+        if PROFILE is not None:
+            PROFILE.count("rotations", turns)
         return False
     def __ne__(self, obj: object) -> bool:
         return not self == obj
+    def __hash__(self) -> int:
+        return hash(self.canonical_key())
+    def encode(self) -> tuple:
+        # face kind ids followed by edge values, with -1 for anything not placed yet
+        faces = tuple(-1 if face is None else face.facekind.kind_id for face in self.get_face_list())
+        edges = tuple(-1 if edge is None else edge.value for edge in self.get_edge_list())
+        return faces + edges
+    def canonical_key(self) -> tuple:
+        if PROFILE is not None:
+            PROFILE.count("rotations", len(ORIENTATION_GETTERS))
+        return canonicalCode(self.encode())
     def get_face_list(self) -> list:
         return [self.top, self.bottom, self.front, self.back, self.left, self.right]
     def get_edge_list(self) -> list:
         return [self.topBackEdge, self.topLeftEdge, self.topFrontEdge, self.topRightEdge, self.backLeftEdge, self.backRightEdge, self.frontLeftEdge, self.frontRightEdge,
                 self.bottomBackEdge, self.bottomLeftEdge, self.bottomFrontEdge, self.bottomRightEdge]
+    def get_state(self) -> tuple:
+        # the 6 faces followed by the 12 edges, the layout the turn tables index into
+        return tuple(self.get_face_list() + self.get_edge_list())
+    def set_edge_list(self, edges) -> None:
+        for name, edge in zip(EDGE_NAMES, edges):
+            setattr(self, name, edge)
+    def reorient(self, turn: tuple):
+        if PROFILE is not None:
+            PROFILE.count("rotations")
+        state = itemgetter(*turn)(self.get_state())
+        cube = Cube(*state[:6])
+        cube.set_edge_list(state[6:])
+        return cube
     # set a face to be the top, then check all 4 rotations
-    # return Cube(self.top, self.bottom, self.front, self.back, self.left, self.right)
     def rotate_top_face_90(self):
         # clockwise rotation
-        cube = Cube(self.top, self.bottom, self.right, self.left, self.front, self.back)
-
-        cube.topBackEdge = self.topLeftEdge
-        cube.topLeftEdge = self.topFrontEdge
-        cube.topFrontEdge = self.topRightEdge
-        cube.topRightEdge = self.topBackEdge
-
-        cube.backLeftEdge = self.frontLeftEdge
-        cube.frontLeftEdge = self.frontRightEdge
-        cube.frontRightEdge = self.backRightEdge
-        cube.backRightEdge = self.backLeftEdge
-
-        cube.bottomBackEdge = self.bottomLeftEdge
-        cube.bottomLeftEdge = self.bottomFrontEdge
-        cube.bottomFrontEdge = self.bottomRightEdge
-        cube.bottomRightEdge = self.bottomBackEdge
-
-        return cube
-    
-    # all these could be just front_to_top and rotate_top_face_90 in various combinations...
+        return self.reorient(ROTATE_TOP_FACE_90)
     def bottom_to_top(self):
-        # could also do front_to_top twice. or anything twice?
-        cube = Cube(self.bottom, self.top, self.back, self.front, self.left, self.right)
-
-        cube.topBackEdge = self.bottomFrontEdge
-        cube.topLeftEdge = self.bottomLeftEdge
-        cube.topFrontEdge = self.bottomBackEdge
-        cube.topRightEdge = self.bottomRightEdge
-
-        cube.backLeftEdge = self.frontLeftEdge
-        cube.frontLeftEdge = self.backLeftEdge
-        cube.frontRightEdge = self.backRightEdge
-        cube.backRightEdge = self.frontRightEdge
-
-        cube.bottomBackEdge = self.topFrontEdge
-        cube.bottomLeftEdge = self.topLeftEdge
-        cube.bottomFrontEdge = self.topBackEdge
-        cube.bottomRightEdge = self.topRightEdge
-        
-        return cube
-    
+        return self.reorient(BOTTOM_TO_TOP)
     def front_to_top(self):
-        cube = Cube(self.front, self.back, self.bottom, self.top, self.left, self.right)
-
-        cube.topBackEdge = self.topFrontEdge
-        cube.topLeftEdge = self.frontLeftEdge
-        cube.topFrontEdge = self.bottomFrontEdge
-        cube.topRightEdge = self.frontRightEdge
-
-        cube.backLeftEdge = self.topLeftEdge
-        cube.frontLeftEdge = self.bottomLeftEdge
-        cube.frontRightEdge = self.bottomRightEdge
-        cube.backRightEdge = self.topRightEdge
-
-        cube.bottomBackEdge = self.topBackEdge
-        cube.bottomLeftEdge = self.backLeftEdge
-        cube.bottomFrontEdge = self.bottomBackEdge
-        cube.bottomRightEdge = self.backRightEdge
-        
-        return cube
-    
+        return self.reorient(FRONT_TO_TOP)
     def back_to_top(self):
-        cube = Cube(self.back, self.front, self.top, self.bottom, self.left, self.right)
-
-        cube.topBackEdge = self.bottomBackEdge
-        cube.topLeftEdge = self.backLeftEdge
-        cube.topFrontEdge = self.topBackEdge
-        cube.topRightEdge = self.backRightEdge
-
-        cube.backLeftEdge = self.bottomLeftEdge
-        cube.frontLeftEdge = self.topLeftEdge
-        cube.frontRightEdge = self.topRightEdge
-        cube.backRightEdge = self.bottomRightEdge
-
-        cube.bottomBackEdge = self.bottomFrontEdge
-        cube.bottomLeftEdge = self.frontLeftEdge
-        cube.bottomFrontEdge = self.topFrontEdge
-        cube.bottomRightEdge = self.frontRightEdge
-        
-        return cube
-    
+        return self.reorient(BACK_TO_TOP)
     def left_to_top(self):
-        cube = Cube(self.left, self.right, self.front, self.back, self.bottom, self.top)
-
-        cube.topBackEdge = self.backLeftEdge
-        cube.topLeftEdge = self.bottomLeftEdge
-        cube.topFrontEdge = self.frontLeftEdge
-        cube.topRightEdge = self.topLeftEdge
-
-        cube.backLeftEdge = self.bottomBackEdge
-        cube.frontLeftEdge = self.bottomFrontEdge
-        cube.frontRightEdge = self.topFrontEdge
-        cube.backRightEdge = self.topBackEdge
-
-        cube.bottomBackEdge = self.backRightEdge
-        cube.bottomLeftEdge = self.bottomRightEdge
-        cube.bottomFrontEdge = self.frontRightEdge
-        cube.bottomRightEdge = self.topRightEdge
-        
-        return cube
-    
+        return self.reorient(LEFT_TO_TOP)
     def right_to_top(self):
-        cube = Cube(self.right, self.left, self.front, self.back, self.top, self.bottom)
-
-        cube.topBackEdge = self.backRightEdge
-        cube.topLeftEdge = self.topRightEdge
-        cube.topFrontEdge = self.frontRightEdge
-        cube.topRightEdge = self.bottomRightEdge
-
-        cube.backLeftEdge = self.topBackEdge
-        cube.frontLeftEdge = self.topFrontEdge
-        cube.frontRightEdge = self.bottomFrontEdge
-        cube.backRightEdge = self.bottomBackEdge
-
-        cube.bottomBackEdge = self.backLeftEdge
-        cube.bottomLeftEdge = self.topLeftEdge
-        cube.bottomFrontEdge = self.frontLeftEdge
-        cube.bottomRightEdge = self.bottomLeftEdge
-        
-        return cube
+        return self.reorient(RIGHT_TO_TOP)
     
     def areFacesValid(self) -> bool:
         okFaceCount = 0
@@ -430,144 +556,1195 @@ class Cube():
             elif ("right" in faces):
                 self.frontRightEdge = edge
 
+def budgetCounts(facekind: FaceKind) -> tuple:
+    # how many of each edge a face kind may use, indexed by Edge value
+    return tuple(facekind.budget.count(edge) for edge in Edge)
+
+class CubeState():
+    # immutable stand-in for Cube while searching: extending it copies a few small tuples
+    # faces holds the FaceKind at each position, edges holds an Edge or None per edge,
+    # budgets holds each placed face's remaining budgetCounts
+    __slots__ = ("faces", "edges", "budgets")
+    def __init__(self, faces: tuple = 6 * (None,), edges: tuple = 12 * (None,), budgets: tuple = 6 * (None,)) -> None:
+        self.faces = faces
+        self.edges = edges
+        self.budgets = budgets
+    def __eq__(self, obj: object) -> bool:
+        return self.canonical_key() == obj.canonical_key()
+    def __ne__(self, obj: object) -> bool:
+        return not self == obj
+    def __hash__(self) -> int:
+        return hash(self.canonical_key())
+    def with_face(self, position, facekind: FaceKind):
+        if isinstance(position, str):
+            position = FACE_NAMES.index(position)
+        faces = self.faces[:position] + (facekind,) + self.faces[position + 1:]
+        budgets = self.budgets[:position] + (budgetCounts(facekind),) + self.budgets[position + 1:]
+        return CubeState(faces, self.edges, budgets)
+    def with_edge(self, x: int, y: int, edge: Edge):
+        # place edge between the faces at positions x and y, spending it from both budgets
+        edgeIndex = EDGE_BETWEEN[(x, y)]
+        edges = self.edges[:edgeIndex] + (edge,) + self.edges[edgeIndex + 1:]
+        budgets = list(self.budgets)
+        for position in (x, y):
+            counts = list(budgets[position])
+            counts[edge.value] -= 1
+            budgets[position] = tuple(counts)
+        return CubeState(self.faces, edges, tuple(budgets))
+    def sides(self, position: int) -> tuple:
+        return tuple(self.edges[i] for i in FACE_SIDES[position])
+    def areFacesValid(self) -> bool:
+        for position, facekind in enumerate(self.faces):
+            if facekind is not None and self.sides(position) not in facekind.legalSides():
+                return False
+        return True
+    def encode(self) -> tuple:
+        faces = tuple(-1 if facekind is None else facekind.kind_id for facekind in self.faces)
+        edges = tuple(-1 if edge is None else edge.value for edge in self.edges)
+        return faces + edges
+    def canonical_key(self) -> tuple:
+        if PROFILE is not None:
+            PROFILE.count("rotations", len(ORIENTATION_GETTERS))
+        return canonicalCode(self.encode())
+    @classmethod
+    def from_code(cls, code: tuple, facekinds: list):
+        # rebuild a state from its encoding, taking face kinds from facekinds by kind_id
+        kinds = {facekind.kind_id: facekind for facekind in facekinds}
+        cube = cls()
+        for position, kindId in enumerate(code[:6]):
+            if kindId != -1:
+                cube = cube.with_face(position, kinds[kindId])
+        for edgeIndex, value in enumerate(code[6:]):
+            if value != -1:
+                x, y = EDGE_FACES[edgeIndex]
+                cube = cube.with_edge(x, y, Edge(value))
+        return cube
+    def to_cube(self) -> Cube:
+        cube = Cube(*[None if facekind is None else Face(facekind) for facekind in self.faces])
+        cube.set_edge_list(self.edges)
+        for position, face in enumerate(cube.get_face_list()):
+            if face is None:
+                continue
+            face.a, face.b, face.c, face.d = self.sides(position)
+            for edge in (face.a, face.b, face.c, face.d):
+                if edge is not None:
+                    face.remainingBudget.remove(edge)
+        return cube
+
 def cullCubes(cubeList: list) -> list:
-    tempCubes = []
+    # keep the first cube seen for each canonical key, instead of comparing against every kept cube
+    tempCubes = {}
     for cube in cubeList:
-        flag = False
-        for reverseCube in tempCubes:
-            if cube == reverseCube:
-                flag = True
-        if not flag:
-            tempCubes.append(cube)
-    return tempCubes
-
-def recursiveEdgeCheck(cube: Cube, newestFace: str, connectedFaces: list):
-    validCubes = []
-    # connectedFaces must be a list of tuples containing 3 elements: the X side, the X side's target edge, and the Y side's target edge, all strings
-    cubeNewestFace = getattr(cube, newestFace)
-    connectedFacesCopy = copy.deepcopy(connectedFaces)
-    targetTuple = connectedFacesCopy.pop(0)
-    cubeTargetFace = getattr(cube, targetTuple[0])
-    sharedBudget = list(set(cubeTargetFace.remainingBudget) & set(cubeNewestFace.remainingBudget))
-    specialChecks = [Edge.SPECIALFULL]
-    if SPECIALTRI_IS_LEGAL:
-        specialChecks.append(Edge.SPECIALTRI)
-    for specialEdge in specialChecks:
-        if specialEdge in sharedBudget and (Empty() not in (cubeNewestFace.facekind, cubeTargetFace.facekind) or cubeNewestFace.facekind == cubeTargetFace.facekind):
+        tempCubes.setdefault(cube.canonical_key(), cube)
+    if PROFILE is not None:
+        PROFILE.count("duplicates", len(cubeList) - len(tempCubes))
+    return list(tempCubes.values())
+
+def sharedEdges(cube: CubeState, target: int, newest: int) -> tuple:
+    return sharedEdgeRule(cube.faces[target], cube.budgets[target], cube.faces[newest], cube.budgets[newest])
+
+def rulesetOf(facekinds: list) -> Ruleset:
+    # the ruleset a list of face kinds was made under; they have to agree
+    rulesets = {facekind.ruleset for facekind in facekinds}
+    if len(rulesets) > 1:
+        raise ValueError("face kinds made under different rulesets: %s" % sorted(map(repr, rulesets)))
+    return rulesets.pop() if rulesets else RULESET
+
+def sharedEdgeRule(targetKind: FaceKind, targetBudget: tuple, newestKind: FaceKind, newestBudget: tuple) -> tuple:
+    # edges both faces can still afford; the special edges only go between an Empty and another kind
+    sharedBudget = [edge for edge in Edge if targetBudget[edge.value] and newestBudget[edge.value]]
+    oneEmpty = (type(targetKind) is Empty) != (type(newestKind) is Empty)
+    for specialEdge in targetKind.ruleset.specialEdges():
+        if specialEdge in sharedBudget and not oneEmpty:
             sharedBudget = [i for i in sharedBudget if i != specialEdge]
-    for edge in sharedBudget:
-        nextCube = copy.deepcopy(cube)
-        nextCubeNewestFace = getattr(nextCube, newestFace)
-        nextCubeTargetFace = getattr(nextCube, targetTuple[0])
-        nextCube.addEdge((newestFace, targetTuple[0]), edge)
-        #nextCubeTargetFace.x = edge
-        setattr(nextCubeTargetFace, targetTuple[1], edge)
-        nextCubeTargetFace.remainingBudget.remove(edge)
-        #nextCubeNewestFace.y = edge
-        setattr(nextCubeNewestFace, targetTuple[2], edge)
-        nextCubeNewestFace.remainingBudget.remove(edge)
-
-        # check and append cube, or recur
-        if connectedFacesCopy:
+    return tuple(sharedBudget)
+
+def reachableBudgets(facekind: FaceKind) -> set:
+    # every remaining budget a face of this kind can be left with while its sides stay legal
+    budgets = set()
+    for sides in facekind.legalSides():
+        counts = list(budgetCounts(facekind))
+        for edge in sides:
+            if edge is not None:
+                counts[edge.value] -= 1
+        budgets.add(tuple(counts))
+    return budgets
+
+class SharedEdgeIndex():
+    # sharedEdgeRule answered ahead of time for every pair of kinds and reachable budgets, so the
+    # search loops only look edges up; built once per enumeration
+    __slots__ = ("table",)
+    def __init__(self, facekinds: list) -> None:
+        self.table = {}
+        budgets = [(facekind, reachableBudgets(facekind)) for facekind in facekinds]
+        for targetKind, targetBudgets in budgets:
+            for newestKind, newestBudgets in budgets:
+                for targetBudget in targetBudgets:
+                    for newestBudget in newestBudgets:
+                        key = (targetKind.kind_id, targetBudget, newestKind.kind_id, newestBudget)
+                        self.table[key] = sharedEdgeRule(targetKind, targetBudget, newestKind, newestBudget)
+    def shared(self, cube: CubeState, target: int, newest: int) -> tuple:
+        targetKind = cube.faces[target]
+        newestKind = cube.faces[newest]
+        key = (targetKind.kind_id, cube.budgets[target], newestKind.kind_id, cube.budgets[newest])
+        edges = self.table.get(key)
+        if edges is None:
+            # only cubes built without the partial face checks (recursiveEdgeCheck) get here
+            edges = self.table[key] = sharedEdgeRule(targetKind, cube.budgets[target], newestKind, cube.budgets[newest])
+        return edges
+
+class BatchValidator():
+    # areFacesValid plus the shared edge rules for a whole block of cubes at once, as NumPy lookups:
+    # faceTable[kind row, a, b, c, d] says whether a kind may have those sides, and edgeTable[kind row, kind row, edge]
+    # whether two kinds may share an edge (in both budgets, special edges only between one Empty and another kind)
+    # -1 means not placed yet, as in CubeState.encode: it maps to a row, and indexes a slot, which allows anything
+    # built for the face kinds given, and so for their ruleset; any other kind_id maps to a row that allows nothing
+    def __init__(self, facekinds: list) -> None:
+        if numpy is None:
+            raise RuntimeError("BatchValidator needs numpy; use CubeState.areFacesValid instead")
+        facekinds = uniqueKinds(facekinds)
+        slots = len(Edge) + 1
+        anything, nothing = len(facekinds), len(facekinds) + 1
+        # every kind_id a catalog record has room for, then -1
+        self.rowOf = numpy.full(257, nothing, dtype=numpy.intp)
+        self.rowOf[-1] = anything
+        self.faceTable = numpy.zeros((len(facekinds) + 2,) + 4 * (slots,), dtype=bool)
+        self.faceTable[anything] = True
+        self.edgeTable = numpy.ones((len(facekinds) + 2, len(facekinds) + 2, slots), dtype=bool)
+        self.edgeTable[nothing] = False
+        self.edgeTable[:, nothing] = False
+        for row, facekind in enumerate(facekinds):
+            self.rowOf[facekind.kind_id] = row
+            for sides in facekind.legalSides():
+                self.faceTable[(row,) + tuple(-1 if edge is None else edge.value for edge in sides)] = True
+            for otherRow, other in enumerate(facekinds):
+                shared = sharedEdgeRule(facekind, budgetCounts(facekind), other, budgetCounts(other))
+                self.edgeTable[row, otherRow, :-1] = False
+                for edge in shared:
+                    self.edgeTable[row, otherRow, edge.value] = True
+        self.kindIds = [facekind.kind_id for facekind in facekinds]
+        self.faceSides = numpy.array(FACE_SIDES)
+        self.edgeFaces = numpy.array(EDGE_FACES)
+    def validate(self, kinds, edges):
+        # kinds: (N, 6) kind_ids, edges: (N, 12) Edge values; returns an (N,) boolean mask of the valid cubes
+        rows = self.rowOf[numpy.asarray(kinds, dtype=numpy.intp)]
+        edges = numpy.asarray(edges, dtype=numpy.intp)
+        sides = edges[:, self.faceSides]
+        faceOk = self.faceTable[rows, sides[..., 0], sides[..., 1], sides[..., 2], sides[..., 3]].all(axis=1)
+        edgeOk = self.edgeTable[rows[:, self.edgeFaces[:, 0]], rows[:, self.edgeFaces[:, 1]], edges].all(axis=1)
+        return faceOk & edgeOk
+    def faceOk(self, codes, position: int):
+        # (N,) whether the face at position of each encoding has sides it may have, or may still be finished into
+        rows = self.rowOf[codes[:, position]]
+        sides = codes[:, 6 + self.faceSides[position]]
+        return self.faceTable[rows, sides[:, 0], sides[:, 1], sides[:, 2], sides[:, 3]]
+    def buildStage(self, codes, newestFace: str, connectedFaces: list):
+        # buildStage for an (N, 18) array of encodings: newestFace added in each kind, then joined to each
+        # connected face with every Edge, dropping the rows where that edge or either face's sides so far break
+        # the rules; rows come out in the order buildStage builds them, and only finished ones survive
+        newest = FACE_NAMES.index(newestFace)
+        built = []
+        for kindId in self.kindIds:
+            rows = codes.copy()
+            rows[:, newest] = kindId
+            for targetTuple in connectedFaces:
+                target = FACE_NAMES.index(targetTuple[0])
+                slot = 6 + EDGE_BETWEEN[(target, newest)]
+                rows = numpy.repeat(rows, len(Edge), axis=0)
+                rows[:, slot] = numpy.tile(numpy.arange(len(Edge)), len(rows) // len(Edge))
+                ok = self.edgeTable[self.rowOf[rows[:, target]], self.rowOf[rows[:, newest]], rows[:, slot]]
+                ok &= self.faceOk(rows, target) & self.faceOk(rows, newest)
+                if PROFILE is not None:
+                    PROFILE.count("generated", len(rows), newestFace)
+                    PROFILE.count("rejected", len(rows) - int(ok.sum()), newestFace)
+                rows = rows[ok]
+            built.append(rows)
+        if not built:
+            return numpy.empty((0, 18), dtype=numpy.intp)
+        return numpy.concatenate(built)
+
+def recursiveEdgeCheck(cube: CubeState, newestFace: str, connectedFaces: list, index: SharedEdgeIndex = None):
+    # yields each valid way of joining newestFace to the faces in connectedFaces
+    # connectedFaces must be a list of tuples containing 3 elements: the X side, the X side's target edge, and the Y side's target edge, all strings
+    # (the target edges are fixed by the cube layout, see FACE_SIDES, so only the X side is needed to find the edge)
+    newest = FACE_NAMES.index(newestFace)
+    targetTuple = connectedFaces[0]
+    target = FACE_NAMES.index(targetTuple[0])
+    edges = sharedEdges(cube, target, newest) if index is None else index.shared(cube, target, newest)
+    for edge in edges:
+        nextCube = cube.with_edge(target, newest, edge)
+
+        # check and yield cube, or recur
+        if len(connectedFaces) > 1:
             # recur
-            validCubes.extend(recursiveEdgeCheck(nextCube, newestFace, connectedFacesCopy))
+            yield from recursiveEdgeCheck(nextCube, newestFace, connectedFaces[1:], index)
         else:
-            # check and append if valid
+            # check and yield if valid
+            if PROFILE is not None:
+                PROFILE.count("generated", stage=newestFace)
             if nextCube.areFacesValid():
-                validCubes.append(nextCube)
-    return validCubes
+                yield nextCube
+            elif PROFILE is not None:
+                PROFILE.count("rejected", stage=newestFace)
 
-if __name__ == "__main__":
-    facekinds = [Empty(), Triangle(), Square()]
+# the layers of the staged build after the bottom: the face added, and the faces it joins as recursiveEdgeCheck's connectedFaces
+STAGES = (("back", [("bottom", "a", "d")]),
+          ("left", [("bottom", "c", "d"), ("back", "c", "b")]),
+          ("front", [("bottom", "d", "d"), ("left", "c", "b")]),
+          ("right", [("bottom", "b", "d"), ("front", "c", "b"), ("back", "b", "c")]),
+          ("top", [("back", "a", "a"), ("left", "a", "b"), ("front", "a", "d"), ("right", "a", "c")]))
 
-    cubeBottoms = []
+def buildStage(cubeList: list, facekinds: list, newestFace: str, connectedFaces: list, index: SharedEdgeIndex = None) -> list:
+    # one layer: every cube in cubeList with newestFace added in each kind and joined up, not yet culled
+    nextCubes = []
     for face in facekinds:
-        cube = Cube()
-        cube.bottom = Face(face)
-        cubeBottoms.append(cube)
-    
-    cubeBacks = []
-    for face in facekinds:
-        for cube in cubeBottoms:
-            modCube = copy.deepcopy(cube)
-            modCube.back = Face(face)
-            cubeBacks.extend(recursiveEdgeCheck(modCube, "back", [("bottom", "a", "d")]))
-    
-    cubeBacks = cullCubes(cubeBacks)
+        for cube in cubeList:
+            modCube = cube.with_face(newestFace, face)
+            nextCubes.extend(recursiveEdgeCheck(modCube, newestFace, connectedFaces, index))
+    return nextCubes
 
-    cubeLefts = []
-    for face in facekinds:
-        for cube in cubeBacks:
-            modCube = copy.deepcopy(cube)
-            modCube.left = Face(face)
-            cubeLefts.extend(recursiveEdgeCheck(modCube, "left", [("bottom", "b", "d"), ("back", "b", "c")]))
-
-    cubeLefts = cullCubes(cubeLefts)
-    # for cube in cubeLefts:
-    #     print()
-    #     print(cube.bottom.facekind, cube.back.facekind, cube.left.facekind)
-    #     print(cube.bottom.a, cube.bottom.b)
-    #     print(cube.back.b)
-    # print(len(cubeLefts))
-
-    cubeFronts = []
-    for face in facekinds:
-        for cube in cubeLefts:
-            modCube = copy.deepcopy(cube)
-            modCube.front = Face(face)
-            cubeFronts.extend(recursiveEdgeCheck(modCube, "front", [("bottom", "d", "d"), ("left", "b", "b")]))
-    
-    cubeFronts = cullCubes(cubeFronts)
-    # for cube in cubeFronts:
-    #     print()
-    #     print(cube.bottom.facekind, cube.back.facekind, cube.left.facekind, cube.front.facekind)
-    #     print(cube.bottom.a, cube.bottom.b, cube.bottom.d)
-    #     print(cube.back.b)
-    #     print(cube.left.b)
-    # print(len(cubeFronts))
-
-    cubeRights = []
-    for face in facekinds:
-        for cube in cubeFronts:
-            modCube = copy.deepcopy(cube)
-            modCube.right = Face(face)
-            cubeRights.extend(recursiveEdgeCheck(modCube, "right", [("bottom", "c", "d"), ("front", "c", "b"), ("back", "c", "c")]))
-    
-    cubeRights = cullCubes(cubeRights)
-    # for cube in cubeRights:
-    #     print()
-    #     print(cube.bottom.facekind, cube.back.facekind, cube.left.facekind, cube.front.facekind, cube.right.facekind)
-    #     print(cube.bottom.a, cube.bottom.b, cube.bottom.d, cube.bottom.c)
-    #     print(cube.back.b)
-    #     print(cube.left.b)
-    #     print(cube.right.b)
-    #     print(cube.right.c)
-    # print(len(cubeRights))
-
-    cubeTops = []
-    for face in facekinds:
-        for cube in cubeRights:
-            modCube = copy.deepcopy(cube)
-            modCube.top = Face(face)
-            cubeTops.extend(recursiveEdgeCheck(modCube, "top", [("back", "a", "a"), ("left", "a", "b"), ("front", "a", "d"), ("right", "a", "c")]))
-    
-    cubeTops = cullCubes(cubeTops)
-    for cube in cubeTops:
-        print()
-        print(cube.bottom.facekind, cube.back.facekind, cube.left.facekind, cube.front.facekind, cube.right.facekind, cube.top.facekind)
-        # print(cube.bottom.a, cube.bottom.b, cube.bottom.d, cube.bottom.c)
-        # print(cube.back.b)
-        # print(cube.left.b)
-        # print(cube.front.c)
-        # print(cube.right.c)
-        # print(cube.top.a, cube.top.b, cube.top.d, cube.top.c)
-        print(cube.bottomBackEdge, cube.bottomLeftEdge, cube.bottomFrontEdge, cube.bottomRightEdge)
-        print(cube.backLeftEdge)
-        print(cube.frontLeftEdge)
-        print(cube.frontRightEdge)
-        print(cube.backRightEdge)
-        print(cube.topBackEdge, cube.topLeftEdge, cube.topFrontEdge, cube.topRightEdge)
-    print(len(cubeTops))
+def cullCodes(codes):
+    # cullCubes for an (N, 18) array of encodings: the first of each rotation class, in order
+    if not len(codes):
+        return codes
+    rows = numpy.arange(len(codes))
+    keys = codes[:, ORIENTATIONS[0]]
+    for turn in ORIENTATIONS[1:]:
+        # keep the turned encoding where it is smaller at the first slot the two differ
+        turned = codes[:, turn]
+        differ = turned != keys
+        first = differ.argmax(axis=1)
+        smaller = differ.any(axis=1) & (turned[rows, first] < keys[rows, first])
+        keys[smaller] = turned[smaller]
+    firsts = numpy.unique(keys, axis=0, return_index=True)[1]
+    return codes[numpy.sort(firsts)]
+
+def stagedCodes(facekinds: list):
+    # stagedCubes with each layer kept as an (N, 18) array of encodings, which BatchValidator.buildStage
+    # joins up and checks and cullCodes culls, so no candidate becomes a CubeState; returns the finished encodings
+    validator = BatchValidator(facekinds)
+    codes = numpy.full((len(facekinds), 18), -1, dtype=numpy.intp)
+    codes[:, 1] = [facekind.kind_id for facekind in facekinds]
+    if PROFILE is not None:
+        PROFILE.count("generated", len(codes), "bottom")
+    for newestFace, connectedFaces in STAGES:
+        if PROFILE is not None:
+            PROFILE.stage = newestFace
+        start = perf_counter()
+        built = validator.buildStage(codes, newestFace, connectedFaces)
+        middle = perf_counter()
+        codes = cullCodes(built)
+        if PROFILE is not None:
+            PROFILE.count("build_seconds", middle - start)
+            PROFILE.count("cull_seconds", perf_counter() - middle)
+    return codes
+
+def stagedCubes(facekinds: list, batch: bool = False) -> list:
+    # the original layer by layer build: bottom, back, left, front, right, top, culling after each layer
+    # batch=True runs it on arrays with stagedCodes instead (needs numpy), for the same cubes in the same order
+    rulesetOf(facekinds)
+    if batch:
+        return decodeCatalog(stagedCodes(facekinds).astype(numpy.uint8).tobytes(), facekinds)
+    index = SharedEdgeIndex(facekinds)
+    cubeList = [CubeState().with_face("bottom", face) for face in facekinds]
+    if PROFILE is not None:
+        PROFILE.count("generated", len(cubeList), "bottom")
+    for newestFace, connectedFaces in STAGES:
+        if PROFILE is not None:
+            PROFILE.stage = newestFace
+        start = perf_counter()
+        built = buildStage(cubeList, facekinds, newestFace, connectedFaces, index)
+        middle = perf_counter()
+        cubeList = cullCubes(built)
+        if PROFILE is not None:
+            PROFILE.count("build_seconds", middle - start)
+            PROFILE.count("cull_seconds", perf_counter() - middle)
+    return cubeList
+
+# the order faces are placed in by the search, each with the already placed faces it shares an edge with
+SEARCH_ORDER = ((1, ()), (3, (1,)), (4, (1, 3)), (2, (1, 4)), (5, (1, 2, 3)), (0, (3, 4, 2, 5)))
+
+def isPartialFaceOk(cube: CubeState, position: int) -> bool:
+    # a face fails early once the sides placed so far can't be finished into a legal face from its budget
+    return cube.sides(position) in cube.faces[position].legalSides()
+
+def searchCubes(cube: CubeState, facekinds: list, index: SharedEdgeIndex, step: int = 0):
+    # depth-first over SEARCH_ORDER, yielding every finished cube that keeps to the budgets and orientation rules
+    if step == len(SEARCH_ORDER):
+        yield cube
+        return
+    position, neighbours = SEARCH_ORDER[step]
+    for facekind in facekinds:
+        nextCube = cube.with_face(position, facekind)
+        if PROFILE is not None:
+            PROFILE.count("generated", stage=FACE_NAMES[position])
+        if isPartialFaceOk(nextCube, position):
+            yield from searchEdges(nextCube, facekinds, index, step, neighbours)
+        elif PROFILE is not None:
+            PROFILE.count("rejected", stage=FACE_NAMES[position])
+
+def searchEdges(cube: CubeState, facekinds: list, index: SharedEdgeIndex, step: int, neighbours: tuple):
+    if not neighbours:
+        yield from searchCubes(cube, facekinds, index, step + 1)
+        return
+    position = SEARCH_ORDER[step][0]
+    target = neighbours[0]
+    for edge in index.shared(cube, target, position):
+        nextCube = cube.with_edge(target, position, edge)
+        if PROFILE is not None:
+            PROFILE.count("generated", stage=FACE_NAMES[position])
+        if isPartialFaceOk(nextCube, target) and isPartialFaceOk(nextCube, position):
+            yield from searchEdges(nextCube, facekinds, index, step, neighbours[1:])
+        elif PROFILE is not None:
+            PROFILE.count("rejected", stage=FACE_NAMES[position])
+
+# the orientations split into their face and edge halves, each indexing its own half of the state
+FACE_TURNS = [turn[:6] for turn in ORIENTATIONS]
+EDGE_TURNS = [tuple(i - 6 for i in turn[6:]) for turn in ORIENTATIONS]
+
+def isOrderlyPrefix(code: tuple, turns: list) -> bool:
+    # code holds the first len(code) slots of an encoding; False once some turn is certain to give a
+    # smaller encoding however the remaining slots are filled
+    placed = len(code)
+    for turn in turns:
+        for i in range(placed):
+            j = turn[i]
+            if j >= placed or code[j] > code[i]:
+                break
+            if code[j] < code[i]:
+                return False
+    return True
+
+def orderlyCubes(facekinds: list, required=None):
+    # yields only the canonical member of each rotation class, so there is nothing to dedup afterwards:
+    # faces and then edges are filled in encoding order, and a branch is dropped as soon as some
+    # rotation of it is certain to encode smaller
+    # with required (a kind, or a collection of kinds, from facekinds), only cubes with at least one face of a required kind
+    rulesetOf(facekinds)
+    facekinds = uniqueKinds(facekinds)
+    required = None if required is None else frozenset(kindIds(required))
+    yield from orderlyFaces(CubeState(), facekinds, SharedEdgeIndex(facekinds), (), required)
+
+def uniqueKinds(facekinds: list) -> list:
+    # a kind listed twice would otherwise be built twice
+    kinds = {}
+    for facekind in facekinds:
+        kinds.setdefault(facekind.kind_id, facekind)
+    return list(kinds.values())
+
+def orderlyKey(facekinds: list):
+    # sort key putting canonical encodings in the order orderlyCubes finds them: face by face, the kinds in
+    # the order facekinds lists them, then edge by edge in Edge order
+    rank = {facekind.kind_id: i for i, facekind in enumerate(uniqueKinds(facekinds))}
+    return lambda code: tuple(rank[kindId] for kindId in code[:6]) + code[6:]
+
+def orderlyFaces(cube: CubeState, facekinds: list, index: SharedEdgeIndex, code: tuple, required: frozenset = None):
+    position = len(code)
+    if position == 6:
+        # only the rotations that leave the face kinds in place can still beat this cube on its edges
+        stabilizer = [EDGE_TURNS[i] for i, turn in enumerate(FACE_TURNS) if itemgetter(*turn)(code) == code]
+        yield from orderlyEdges(cube, index, stabilizer, ())
+        return
+    # containing a kind doesn't depend on the orientation, so this can't upset the orderly pruning
+    lastChance = required is not None and position == 5 and required.isdisjoint(code)
+    for facekind in facekinds:
+        if lastChance and facekind.kind_id not in required:
+            continue
+        nextCode = code + (facekind.kind_id,)
+        if PROFILE is not None:
+            PROFILE.count("generated", stage=FACE_NAMES[position])
+        if isOrderlyPrefix(nextCode, FACE_TURNS):
+            nextCube = cube.with_face(position, facekind)
+            if isPartialFaceOk(nextCube, position):
+                yield from orderlyFaces(nextCube, facekinds, index, nextCode, required)
+            elif PROFILE is not None:
+                PROFILE.count("rejected", stage=FACE_NAMES[position])
+        elif PROFILE is not None:
+            PROFILE.count("pruned", stage=FACE_NAMES[position])
+
+def orderlyEdges(cube: CubeState, index: SharedEdgeIndex, stabilizer: list, code: tuple):
+    edgeIndex = len(code)
+    if edgeIndex == 12:
+        yield cube
+        return
+    x, y = EDGE_FACES[edgeIndex]
+    for edge in index.shared(cube, x, y):
+        nextCode = code + (edge.value,)
+        # edges are filled in after all the faces, so they count toward the later face of the two
+        if PROFILE is not None:
+            PROFILE.count("generated", stage=FACE_NAMES[y])
+        if not isOrderlyPrefix(nextCode, stabilizer):
+            if PROFILE is not None:
+                PROFILE.count("pruned", stage=FACE_NAMES[y])
+            continue
+        nextCube = cube.with_edge(x, y, edge)
+        if isPartialFaceOk(nextCube, x) and isPartialFaceOk(nextCube, y):
+            yield from orderlyEdges(nextCube, index, stabilizer, nextCode)
+        elif PROFILE is not None:
+            PROFILE.count("rejected", stage=FACE_NAMES[y])
+
+# set once in each pool worker by initShardWorker
+shardKinds = None
+shardIndex = None
+shardRequired = None
+
+def initShardWorker(facekinds: list, required: frozenset = None) -> None:
+    # the face kinds bring their ruleset along with them
+    global shardKinds, shardIndex, shardRequired
+    shardKinds = facekinds
+    shardIndex = SharedEdgeIndex(facekinds)
+    shardRequired = required
+
+def orderlyShard(prefix: tuple) -> list:
+    # one pool task: canonical keys of the orderly cubes whose leading face kinds are prefix
+    cube = CubeState()
+    code = ()
+    for facekind in prefix:
+        code += (facekind.kind_id,)
+        if not isOrderlyPrefix(code, FACE_TURNS):
+            return []
+        cube = cube.with_face(len(code) - 1, facekind)
+        if not isPartialFaceOk(cube, len(code) - 1):
+            return []
+    return [bytes(cube.encode()) for cube in orderlyFaces(cube, shardKinds, shardIndex, code, shardRequired)]
+
+def parallelCubes(facekinds: list, jobs: int, required=None):
+    # orderlyCubes split by (top, bottom) face kinds over a process pool; shards are yielded in the
+    # order the serial search would visit them, so the output is the same for any number of jobs
+    rulesetOf(facekinds)
+    facekinds = uniqueKinds(facekinds)
+    required = None if required is None else frozenset(kindIds(required))
+    shards = [(top, bottom) for top in facekinds for bottom in facekinds]
+    seen = set()
+    with multiprocessing.Pool(jobs, initShardWorker, (facekinds, required)) as pool:
+        for keys in pool.imap(orderlyShard, shards):
+            for key in keys:
+                if key not in seen:
+                    seen.add(key)
+                    yield CubeState.from_code(key, facekinds)
+
+def iter_cubes(facekinds: list, orderly: bool = True, jobs: int = 1):
+    # yields every distinct cube buildable from facekinds as soon as it is found, one per rotation class
+    # jobs > 1 runs the orderly search in that many processes; the plain search only runs in this one
+    # every kind has to come from one ruleset, as a rule mix has no meaning (see rulesetOf)
+    rulesetOf(facekinds)
+    if jobs > 1 and not orderly:
+        raise ValueError("only the orderly search runs in more than one process")
+    if jobs > 1:
+        yield from parallelCubes(facekinds, jobs)
+    elif orderly:
+        # orderly cubes are distinct by construction
+        yield from orderlyCubes(facekinds)
+    else:
+        # finished keys have no -1 slots, so they pack into 18 bytes
+        seen = set()
+        for cube in searchCubes(CubeState(), facekinds, SharedEdgeIndex(facekinds)):
+            if PROFILE is not None:
+                PROFILE.stage = "dedup"
+            key = bytes(cube.canonical_key())
+            if key not in seen:
+                seen.add(key)
+                yield cube
+            elif PROFILE is not None:
+                PROFILE.count("duplicates")
+
+def enumerateCubes(facekinds: list, orderly: bool = True, jobs: int = 1) -> list:
+    # every distinct cube buildable from facekinds, one per rotation class
+    return list(iter_cubes(facekinds, orderly, jobs))
+
+# a face seen from the other side: b and c swap, left handed kinds and edges become right handed and back
+# (legalSides of each kind maps exactly onto legalSides of its mirror kind this way)
+MIRROR_KIND = {TipLeft.kind_id: TipRight.kind_id, TipRight.kind_id: TipLeft.kind_id,
+               BaseLeft.kind_id: BaseRight.kind_id, BaseRight.kind_id: BaseLeft.kind_id}
+MIRROR_EDGE = {Edge.HALF_LEFT.value: Edge.HALF_RIGHT.value, Edge.HALF_RIGHT.value: Edge.HALF_LEFT.value}
+
+# the reflection swapping left and right, as a turn table: with the 24 rotations, and each of them after it,
+# it makes up the full symmetry group of the cube; faces and edges also change hands as above
+MIRROR_TURN = (0, 1, 2, 3, 5, 4,  6, 9, 8, 7, 11, 10, 13, 12, 14, 17, 16, 15)
+
+def mirrorCode(code: tuple) -> tuple:
+    # the encoding of the cube's mirror image
+    code = itemgetter(*MIRROR_TURN)(code)
+    return tuple(MIRROR_KIND.get(kindId, kindId) for kindId in code[:6]) + tuple(MIRROR_EDGE.get(edge, edge) for edge in code[6:])
+
+def canonicalSymmetry(code: tuple) -> tuple:
+    # canonical_key for an encoding, along with what the same pass over the symmetry group shows about it:
+    # its stabilizer size (how many rotations leave it as it is, so it has 24 // that distinct orientations)
+    # and the canonical key of its mirror image, which is the key itself when the cube is its own mirror twin
+    turned = [getter(code) for getter in ORIENTATION_GETTERS]
+    mirrored = mirrorCode(code)
+    return min(turned), turned.count(code), canonicalCode(mirrored)
+
+def faceSignature(code: tuple, position: int) -> tuple:
+    # the face at position of an encoded cube as (kind_id, a, b, c, d), seen from outside in its FACE_SIDES frame
+    return (code[position],) + tuple(code[6 + i] for i in FACE_SIDES[position])
+
+def mirrorSignature(signature: tuple) -> tuple:
+    kindId, a, b, c, d = signature
+    return (MIRROR_KIND.get(kindId, kindId),) + tuple(MIRROR_EDGE.get(edge, edge) for edge in (a, c, b, d))
+
+class NeighbourTable():
+    # which blocks can sit against which: block a held in orientation i (an index into ORIENTATIONS) with block b
+    # held in orientation j on its right, so a's right face presses on b's left face
+    # the faces fit when a's right face is b's left face seen from the other side, which is a hash join on
+    # signatures: buckets maps a signature to the (record, orientation) pairs showing it on their right and
+    # those showing its mirror on their left, and every one of the first fits every one of the second
+    # neighbours in any other direction are these with both blocks turned the same way
+    # a block with rotational symmetry is listed once per distinct placement, under the first orientation giving it
+    def __init__(self, records) -> None:
+        # records: a Catalog, or any iterable of CubeStates or encodings
+        self.codes = []
+        buckets = {}
+        for record in records:
+            code = record.encode() if isinstance(record, CubeState) else tuple(record)
+            code = canonicalCode(code)
+            number = len(self.codes)
+            self.codes.append(code)
+            # turns that leave the block looking the same would only file it again as the same placement
+            placed = set()
+            for turn, getter in enumerate(ORIENTATION_GETTERS):
+                turned = getter(code)
+                if turned in placed:
+                    continue
+                placed.add(turned)
+                right = faceSignature(turned, 5)
+                left = mirrorSignature(faceSignature(turned, 4))
+                buckets.setdefault(right, ([], []))[0].append((number, turn))
+                buckets.setdefault(left, ([], []))[1].append((number, turn))
+        self.buckets = {signature: sides for signature, sides in buckets.items() if sides[0] and sides[1]}
+    def neighbours(self, number: int, turn: int) -> list:
+        # the (record, orientation) pairs that fit on the right of record number held in orientation turn
+        signature = faceSignature(ORIENTATION_GETTERS[turn](self.codes[number]), 5)
+        return list(self.buckets.get(signature, ((), ()))[1])
+    def pairs(self):
+        # every fitting ((a, i), (b, j)), b on the right of a
+        for rights, lefts in self.buckets.values():
+            for right in rights:
+                for left in lefts:
+                    yield right, left
+    def __len__(self) -> int:
+        return sum(len(rights) * len(lefts) for rights, lefts in self.buckets.values())
+
+def extendCatalog(cubes: list, facekinds: list, newKind: FaceKind, jobs: int = 1) -> list:
+    # cubes is the catalog for facekinds; returns the catalog for facekinds plus newKind by searching only
+    # for cubes with a newKind face, which are all that can be new: whether two faces may share an edge
+    # depends on just those two kinds, so no cube of the old kinds changes
+    # the result is in the order enumerateCubes lists the catalog for facekinds plus newKind
+    rulesetOf(list(facekinds) + [newKind])
+    allKinds = uniqueKinds(list(facekinds) + [newKind])
+    if jobs > 1:
+        found = parallelCubes(allKinds, jobs, newKind)
+    else:
+        found = orderlyCubes(allKinds, newKind)
+    catalog = {}
+    for cube in cubes:
+        catalog.setdefault(cube.canonical_key(), cube)
+    for cube in found:
+        catalog.setdefault(cube.canonical_key(), cube)
+    return [catalog[key] for key in sorted(catalog, key=orderlyKey(allKinds))]
+
+def agreedKinds(kindSets: list) -> list:
+    # positions of the kinds that come out the same under every ruleset (same budget, same legal sides, and
+    # the same edges allowed against each other), so the cubes made of only them are the same too
+    agreed = []
+    for i, kinds in enumerate(zip(*kindSets)):
+        if len({(budgetCounts(facekind), facekind.legalSides()) for facekind in kinds}) == 1:
+            agreed.append(i)
+    changed = True
+    while changed:
+        changed = False
+        for i in agreed:
+            for j in agreed:
+                rules = {sharedEdgeRule(kinds[i], budgetCounts(kinds[i]), kinds[j], budgetCounts(kinds[j])) for kinds in kindSets}
+                if len(rules) > 1:
+                    agreed = [k for k in agreed if k not in (i, j)]
+                    changed = True
+                    break
+            if changed:
+                break
+    return agreed
+
+def sweepTask(task: tuple) -> bytes:
+    # one search of a sweep: the packed encodings of the orderly cubes of facekinds with a required kind
+    facekinds, required = task
+    return b"".join(bytes(cube.encode()) for cube in orderlyCubes(facekinds, required))
+
+def sweepRulesets(kindClasses: list, rulesets: list, jobs: int = 1) -> dict:
+    # the catalog of the same face kind classes under each ruleset, as {ruleset: list of CubeStates}
+    # the rotation tables are shared anyway; on top of that the cubes made only of kinds every ruleset agrees on
+    # are searched once for all of them, and each ruleset only searches for cubes with a kind that differs,
+    # with the searches spread over jobs processes
+    kindSets = [ruleset.kinds(kindClasses) for ruleset in rulesets]
+    agreed = agreedKinds(kindSets)
+    tasks = [(kinds, [facekind for i, facekind in enumerate(kinds) if i not in agreed]) for kinds in kindSets]
+    if agreed:
+        tasks.append(([kindSets[0][i] for i in agreed], None))
+    if jobs > 1:
+        with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+            found = pool.map(sweepTask, tasks)
+    else:
+        found = [sweepTask(task) for task in tasks]
+    shared = found[len(kindSets)] if agreed else b""
+    return {ruleset: decodeCatalog(shared + data, kinds) for ruleset, kinds, data in zip(rulesets, kindSets, found)}
+
+# where cachedCubes keeps catalogs; bump CATALOG_VERSION when a change to the search or the
+# file layout would make old catalogs wrong in a way catalogKey can't see
+CACHE_DIR = os.environ.get("CUBES_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "cubes"))
+CATALOG_VERSION = 2
+
+def catalogKey(facekinds: list) -> str:
+    # content hash of everything the catalog depends on: each kind, its budget, the finished faces it allows
+    # (so edits to an orientationCheck count too) and the ruleset; kinds stay in the order given,
+    # since that is the order the cubes are listed in
+    kinds = []
+    for facekind in uniqueKinds(facekinds):
+        legal = sorted(tuple(edge.value for edge in sides) for sides in facekind.legalSides() if None not in sides)
+        kinds.append([type(facekind).__name__, facekind.kind_id, budgetCounts(facekind), legal])
+    content = json.dumps([CATALOG_VERSION, rulesetOf(facekinds).key(), kinds])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def decodeCatalog(data, facekinds: list) -> list:
+    # CubeState.from_code for a whole buffer of catalog records of finished cubes; a face's remaining budget only
+    # depends on its kind and sides, so each is worked out once instead of replaying every with_edge
+    kinds = {facekind.kind_id: facekind for facekind in facekinds}
+    edgeList = tuple(Edge)
+    leftOver = {}
+    cubes = []
+    for start in range(0, len(data), 18):
+        code = data[start:start + 18]
+        faces = tuple(kinds[kindId] for kindId in code[:6])
+        edges = tuple(edgeList[value] for value in code[6:])
+        budgets = []
+        for position, kindId in enumerate(code[:6]):
+            sides = (kindId,) + tuple(code[6 + i] for i in FACE_SIDES[position])
+            budget = leftOver.get(sides)
+            if budget is None:
+                counts = list(budgetCounts(kinds[kindId]))
+                for value in sides[1:]:
+                    counts[value] -= 1
+                budget = leftOver[sides] = tuple(counts)
+            budgets.append(budget)
+        cubes.append(CubeState(faces, edges, tuple(budgets)))
+    return cubes
+
+# catalog files: a header (magic, format version, record size, record count) and then one fixed width record
+# per cube, its encoding as 6 face kind_id bytes followed by 12 Edge value bytes
+CATALOG_MAGIC = b"CUBCAT"
+CATALOG_FORMAT = 1
+CATALOG_HEADER = struct.Struct("<6sBBQ")
+RECORD_SIZE = 18
+RECORD_DTYPE = [("faces", "u1", (6,)), ("edges", "u1", (12,))]
+
+def writeCatalog(path: str, cubes) -> int:
+    # streams cubes (CubeStates or encodings) into a catalog file and returns how many were written;
+    # written aside and renamed into place, so a reader never sees half a catalog, and a failed write leaves nothing
+    temp = "%s.%d.tmp" % (path, os.getpid())
+    count = 0
+    try:
+        with open(temp, "wb") as f:
+            f.write(CATALOG_HEADER.pack(CATALOG_MAGIC, CATALOG_FORMAT, RECORD_SIZE, 0))
+            for cube in cubes:
+                code = cube.encode() if isinstance(cube, CubeState) else tuple(cube)
+                if len(code) != RECORD_SIZE or -1 in code:
+                    raise ValueError("only finished cubes go in a catalog, not %s" % (code,))
+                f.write(bytes(code))
+                count += 1
+            f.seek(0)
+            f.write(CATALOG_HEADER.pack(CATALOG_MAGIC, CATALOG_FORMAT, RECORD_SIZE, count))
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return count
+
+class Catalog():
+    # a catalog file mapped into memory: records is a flat memoryview over the record bytes and array()
+    # a NumPy structured array over them, neither copying anything or making a Python object per cube
+    # views handed out keep the mapping open, so drop them before close()
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) < CATALOG_HEADER.size:
+            self.mm.close()
+            raise ValueError("%s is too short to be a cube catalog" % path)
+        magic, version, recordSize, self.count = CATALOG_HEADER.unpack_from(self.mm)
+        if magic != CATALOG_MAGIC or version != CATALOG_FORMAT or recordSize != RECORD_SIZE:
+            self.mm.close()
+            raise ValueError("%s is not a version %d cube catalog" % (path, CATALOG_FORMAT))
+        if len(self.mm) != CATALOG_HEADER.size + self.count * RECORD_SIZE:
+            self.mm.close()
+            raise ValueError("%s should hold %d records" % (path, self.count))
+        self.records = memoryview(self.mm)[CATALOG_HEADER.size:]
+    def __len__(self) -> int:
+        return self.count
+    def __getitem__(self, i: int) -> memoryview:
+        # record i, the same 18 values as CubeState.encode
+        if not -self.count <= i < self.count:
+            raise IndexError("catalog record out of range")
+        start = (i % self.count) * RECORD_SIZE
+        return self.records[start:start + RECORD_SIZE]
+    def array(self):
+        if numpy is None:
+            raise RuntimeError("Catalog.array needs numpy; use Catalog.records instead")
+        return numpy.frombuffer(self.mm, numpy.dtype(RECORD_DTYPE), self.count, CATALOG_HEADER.size)
+    def cubes(self, facekinds: list) -> list:
+        return decodeCatalog(self.records, facekinds)
+    def close(self) -> None:
+        self.records.release()
+        self.mm.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc) -> bool:
+        self.close()
+        return False
+
+def kindIds(kinds) -> list:
+    # one FaceKind (instance or class) or kind_id, or a collection of them, as a list of kind_ids
+    if isinstance(kinds, (list, tuple, set, frozenset)):
+        return [kind if isinstance(kind, int) else kind.kind_id for kind in kinds]
+    return [kinds if isinstance(kinds, int) else kinds.kind_id]
+
+def edgeValues(edges) -> list:
+    if isinstance(edges, (list, tuple, set, frozenset)):
+        return [edge.value for edge in edges]
+    return [edges.value]
+
+class CatalogIndex():
+    # inverted indexes over a catalog, each cube held in its canonical orientation as a record number:
+    # the kind at each face, the Edge at each edge, how many faces of each kind, and the whole multiset of kinds
+    # query() intersects the posting sets of its constraints, smallest first, so it costs about as much as
+    # the smallest of them rather than the catalog
+    # canonicalising also gives each record's stabilizer size and mirror twin, see symmetry()
+    def __init__(self, records) -> None:
+        # records: a Catalog, or any iterable of CubeStates or encodings
+        self.codes = []
+        self.stabilizers = []
+        mirrors = []
+        self.postings = {}
+        for record in records:
+            code = record.encode() if isinstance(record, CubeState) else tuple(record)
+            code, stabilizer, mirror = canonicalSymmetry(code)
+            number = len(self.codes)
+            self.codes.append(code)
+            self.stabilizers.append(stabilizer)
+            mirrors.append(mirror)
+            keys = [("face", position, kindId) for position, kindId in enumerate(code[:6])]
+            keys += [("edge", edgeIndex, value) for edgeIndex, value in enumerate(code[6:])]
+            kindCounts = Counter(code[:6])
+            keys += [("count", kindId, n) for kindId, n in kindCounts.items()]
+            keys.append(("multiset", tuple(sorted(code[:6]))))
+            for key in keys:
+                posting = self.postings.get(key)
+                if posting is None:
+                    posting = self.postings[key] = set()
+                posting.add(number)
+        # and the records without each kind, so kinds={Triangle: 0} is a lookup too
+        everything = set(range(len(self.codes)))
+        for kindId in {key[2] for key in self.postings if key[0] == "face"}:
+            self.postings[("count", kindId, 0)] = everything - self.posting([("face", position, kindId) for position in range(6)])
+        # each record's mirror twin: itself when it is its own mirror image, None when the twin needs a kind
+        # the catalog wasn't built with (TipLeft without TipRight, say)
+        records = {code: number for number, code in enumerate(self.codes)}
+        self.twins = [records.get(mirror) for mirror in mirrors]
+    def __len__(self) -> int:
+        return len(self.codes)
+    def symmetry(self, number: int) -> dict:
+        if not 0 <= number < len(self.codes):
+            raise IndexError("no record %d in a catalog of %d" % (number, len(self.codes)))
+        stabilizer = self.stabilizers[number]
+        twin = self.twins[number]
+        return {"stabilizer": stabilizer, "orientations": 24 // stabilizer, "chiral": twin != number, "twin": twin}
+    def posting(self, keys: list) -> set:
+        # records matching any of keys
+        if len(keys) == 1:
+            return self.postings.get(keys[0], set())
+        return set().union(*(self.postings.get(key, ()) for key in keys))
+    def query(self, faces: dict = None, edges: dict = None, kinds: dict = None, multiset=None, rotated: bool = False) -> list:
+        # record numbers, in order, of the cubes matching every constraint given:
+        # faces maps a face (name or position) to a kind or a collection of kinds it may be,
+        # edges maps an edge (name, as in EDGE_NAMES, or index) to an Edge or a collection of Edges,
+        # kinds maps a kind to exactly how many faces have it, and multiset is all 6 face kinds in any order
+        # faces and edges are positions in the canonical orientation; rotated=True matches them in any orientation
+        slots = {}
+        for position, allowed in (faces or {}).items():
+            if isinstance(position, str):
+                position = FACE_NAMES.index(position)
+            slots[position] = ("face", kindIds(allowed))
+        for edgeIndex, allowed in (edges or {}).items():
+            if isinstance(edgeIndex, str):
+                edgeIndex = EDGE_NAMES.index(edgeIndex)
+            slots[6 + edgeIndex] = ("edge", edgeValues(allowed))
+        # a kind no record has is on no face of any of them, so needing none of it rules nothing out
+        fixed = [[("count", kindIds(kind)[0], n)] for kind, n in (kinds or {}).items()]
+        fixed = [keys for keys in fixed if keys[0][2] != 0 or keys[0] in self.postings]
+        if multiset is not None:
+            fixed.append([("multiset", tuple(sorted(kindIds(list(multiset)))))])
+        turns = ORIENTATIONS if rotated else [IDENTITY]
+        found = set()
+        for turn in turns:
+            # slot i of the turned cube is slot turn[i] of the canonical one
+            groups = list(fixed)
+            for slot, (kind, values) in slots.items():
+                canonical = turn[slot]
+                position = canonical if kind == "face" else canonical - 6
+                groups.append([(kind, position, value) for value in values])
+            if not groups:
+                return list(range(len(self.codes)))
+            postings = sorted((self.posting(keys) for keys in groups), key=len)
+            found |= postings[0].intersection(*postings[1:])
+        return sorted(found)
+    def cubes(self, numbers: list, facekinds: list) -> list:
+        # the CubeStates for some record numbers, in canonical orientation
+        return [CubeState.from_code(self.codes[number], facekinds) for number in numbers]
+
+def cachedCubes(facekinds: list, jobs: int = 1, cacheDir: str = None) -> list:
+    # enumerateCubes, but kept on disk as a catalog file named by catalogKey; when only the last kind is
+    # missing from what is cached, the cached catalog is grown with extendCatalog instead
+    cacheDir = CACHE_DIR if cacheDir is None else cacheDir
+    path = os.path.join(cacheDir, catalogKey(facekinds) + ".cat")
+    # a file that is missing, or empty, cut short or not a catalog (Catalog raises ValueError) is a miss,
+    # and gets overwritten
+    try:
+        with Catalog(path) as catalog:
+            return catalog.cubes(facekinds)
+    except (FileNotFoundError, ValueError):
+        pass
+    try:
+        with Catalog(os.path.join(cacheDir, catalogKey(facekinds[:-1]) + ".cat")) as catalog:
+            older = catalog.cubes(facekinds[:-1])
+    except (FileNotFoundError, ValueError):
+        older = None
+    if older is None:
+        cubes = enumerateCubes(facekinds, jobs=jobs)
+    else:
+        cubes = extendCatalog(older, facekinds[:-1], facekinds[-1], jobs)
+    os.makedirs(cacheDir, exist_ok=True)
+    writeCatalog(path, cubes)
+    return cubes
+
+def isNumber(value) -> bool:
+    # a JSON integer; json gives true and false as bools, which are ints to Python
+    return isinstance(value, int) and not isinstance(value, bool)
+
+class CatalogServer():
+    # keeps one catalog and its CatalogIndex in memory and answers queries about it, one JSON object per line
+    # each request is {"op": ..., ...}, each answer a JSON object, or {"error": message}:
+    #   info: the face kinds, ruleset and number of blocks
+    #   lookup: {"code": an encoding in any orientation} -> its record number, or null, and canonical encoding
+    #   query / count: faces, edges, kinds, multiset and rotated as for CatalogIndex.query, with kinds named as
+    #     str() gives them and edges by Edge name; query answers records and codes (limit caps how many), count just count
+    #   orientations: {"record": n} -> that block's encoding in each of the 24 orientations
+    #   symmetry: {"record": n} -> its stabilizer size, distinct orientations, and mirror twin (see CatalogIndex.symmetry)
+    def __init__(self, facekinds: list, cubes: list) -> None:
+        self.facekinds = uniqueKinds(facekinds)
+        self.kindsByName = {str(facekind): facekind for facekind in self.facekinds}
+        self.index = CatalogIndex(cubes)
+        self.records = {code: number for number, code in enumerate(self.index.codes)}
+    def kinds(self, names):
+        if isinstance(names, list):
+            return [self.kindsByName[name] for name in names]
+        return self.kindsByName[names]
+    def edges(self, names):
+        if isinstance(names, list):
+            return [Edge[name] for name in names]
+        return Edge[names]
+    def record(self, request: dict) -> int:
+        number = request["record"]
+        if not isNumber(number) or not 0 <= number < len(self.index):
+            raise ValueError("record must be an int from 0 to %d, not %s" % (len(self.index) - 1, json.dumps(number)))
+        return number
+    def find(self, request: dict) -> list:
+        return self.index.query({face: self.kinds(kinds) for face, kinds in request.get("faces", {}).items()},
+                                {edge: self.edges(edges) for edge, edges in request.get("edges", {}).items()},
+                                {self.kindsByName[kind]: n for kind, n in request.get("kinds", {}).items()},
+                                None if request.get("multiset") is None else self.kinds(request["multiset"]),
+                                request.get("rotated", False))
+    def handle(self, request: dict) -> dict:
+        if not isinstance(request, dict):
+            raise ValueError("a request must be a JSON object, not %s" % json.dumps(request))
+        op = request.get("op")
+        if op == "info":
+            return {"kinds": list(self.kindsByName), "ruleset": rulesetOf(self.facekinds).key(), "count": len(self.index)}
+        if op == "lookup":
+            code = request["code"]
+            if not isinstance(code, list) or len(code) != 18 or not all(isNumber(value) for value in code):
+                raise ValueError("code must be a list of 18 ints, not %s" % json.dumps(code))
+            key = canonicalCode(tuple(code))
+            return {"record": self.records.get(key), "code": key}
+        if op == "query":
+            numbers = self.find(request)
+            limit = request.get("limit", len(numbers))
+            if not isNumber(limit) or limit < 0:
+                raise ValueError("limit must be a non-negative int, not %s" % json.dumps(limit))
+            shown = numbers[:limit]
+            return {"count": len(numbers), "records": shown, "codes": [self.index.codes[number] for number in shown]}
+        if op == "count":
+            return {"count": len(self.find(request))}
+        if op == "symmetry":
+            return self.index.symmetry(self.record(request))
+        if op == "orientations":
+            code = self.index.codes[self.record(request)]
+            return {"codes": [getter(code) for getter in ORIENTATION_GETTERS]}
+        raise ValueError("unknown op %r" % op)
+    async def serveClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    answer = self.handle(json.loads(line))
+                except (ValueError, KeyError, IndexError, TypeError, AttributeError) as error:
+                    answer = {"error": "%s: %s" % (type(error).__name__, error)}
+                writer.write(json.dumps(answer).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+    async def serve(self, path: str = None, port: int = None) -> None:
+        # on the Unix socket at path, or else on localhost:port
+        if path is not None:
+            server = await asyncio.start_unix_server(self.serveClient, path)
+        else:
+            server = await asyncio.start_server(self.serveClient, "127.0.0.1", port)
+        async with server:
+            await server.serve_forever()
+
+def serveCatalog(facekinds: list, path: str = None, port: int = None, jobs: int = 1) -> None:
+    # load (or enumerate and cache) the catalog once, then answer queries until stopped
+    server = CatalogServer(facekinds, cachedCubes(facekinds, jobs))
+    asyncio.run(server.serve(path, port))
+
+def queryServer(request: dict, path: str = None, port: int = None) -> dict:
+    # one request to a running CatalogServer, for scripts that don't want to hold a connection open
+    if path is not None:
+        connection = socket.socket(socket.AF_UNIX)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection(("127.0.0.1", port))
+    with connection, connection.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        answer = json.loads(stream.readline())
+    if "error" in answer:
+        raise ValueError(answer["error"])
+    return answer
+
+def faceTiles(facekinds: list) -> Counter:
+    # every finished face as (is Empty, a, b, c, d) with edge values for sides, counting the kinds that allow it;
+    # whether a face is Empty is all the special edge rule needs to know about its kind
+    tiles = Counter()
+    for facekind in facekinds:
+        isEmpty = int(type(facekind) is Empty)
+        for sides in facekind.legalSides():
+            if None not in sides:
+                tiles[(isEmpty,) + tuple(edge.value for edge in sides)] += 1
+    return tiles
+
+def countLabelled(tiles: Counter, specials: set) -> int:
+    # every legal cube, rotations counted separately: walk the ring of side faces (front, right, back, left,
+    # each one's c side being the next one's b side) and look up how many tops and bottoms fit each ring
+    ends = Counter()
+    byLeft = {}
+    byLeftRight = {}
+    for (isEmpty, a, b, c, d), count in tiles.items():
+        ends[(a, b, c, d, isEmpty)] += count
+        tile = (isEmpty, a, b, c, d, count)
+        byLeft.setdefault(b, []).append(tile)
+        byLeftRight.setdefault((b, c), []).append(tile)
+    total = 0
+    for front in tiles:
+        frontCount = tiles[front]
+        front = front + (frontCount,)
+        for right in byLeft.get(front[3], ()):
+            if front[3] in specials and front[0] == right[0]:
+                continue
+            for back in byLeft.get(right[3], ()):
+                if right[3] in specials and right[0] == back[0]:
+                    continue
+                for left in byLeftRight.get((back[3], front[2]), ()):
+                    if back[3] in specials and back[0] == left[0]:
+                        continue
+                    if left[3] in specials and left[0] == front[0]:
+                        continue
+                    # the top's a, b, c, d meet back, left, right, front; the bottom's meet back, right, left, front
+                    top = countEnds(ends, specials, (back, left, right, front), 1)
+                    if top:
+                        bottom = countEnds(ends, specials, (back, right, left, front), 4)
+                        total += frontCount * right[5] * back[5] * left[5] * top * bottom
+    return total
+
+def countEnds(ends: Counter, specials: set, ring: tuple, side: int) -> int:
+    # how many top (side 1, the ring's a sides) or bottom (side 4, the d sides) faces fit the ring tiles given
+    # in that face's a, b, c, d order; across a special edge the end must differ from the ring tile in being Empty
+    values = tuple(tile[side] for tile in ring)
+    isEmpty = None
+    for tile, value in zip(ring, values):
+        if value in specials:
+            if isEmpty == tile[0]:
+                return 0
+            isEmpty = 1 - tile[0]
+    if isEmpty is None:
+        return ends[values + (0,)] + ends[values + (1,)]
+    return ends[values + (isEmpty,)]
+
+def kindSides(facekinds: list) -> list:
+    # each kind as (is Empty, the set of its finished faces as a, b, c, d edge values)
+    return [(int(type(facekind) is Empty), {tuple(edge.value for edge in sides) for sides in facekind.legalSides() if None not in sides})
+            for facekind in facekinds]
+
+def countFixed(turn: tuple, kinds: list, specials: set) -> int:
+    # legal cubes that turn leaves unchanged: every slot holds the same value as the rest of its cycle under
+    # turn, so count over one value per cycle, memoizing each sub-count on just the values later checks read
+    cycleOf = list(range(18))
+    for slot in range(18):
+        cycle = [slot]
+        while turn[cycle[-1]] != slot:
+            cycle.append(turn[cycle[-1]])
+        cycleOf[slot] = min(cycle)
+    # a face cycle holds whether its faces are Empty, and since its faces share a kind they're checked together
+    checks = []
+    for position in range(6):
+        if cycleOf[position] == position:
+            faces = [tuple(cycleOf[6 + i] for i in FACE_SIDES[face]) for face in range(6) if cycleOf[face] == position]
+            checks.append((position, faces, {position}.union(*faces)))
+    for edgeIndex, (x, y) in enumerate(EDGE_FACES):
+        if cycleOf[6 + edgeIndex] == 6 + edgeIndex:
+            slots = (cycleOf[x], cycleOf[y], 6 + edgeIndex)
+            checks.append((None, slots, set(slots)))
+
+    # fill next whichever cycle leaves the fewest values waiting on unfinished checks
+    order = []
+    remaining = sorted(set(cycleOf))
+    while remaining:
+        def waiting(slot: int) -> int:
+            filled = set(order) | {slot}
+            return len(set().union(*[slots & filled for _, _, slots in checks if not slots <= filled]))
+        order.append(min(remaining, key=waiting))
+        remaining.remove(order[-1])
+    step = {slot: i for i, slot in enumerate(order)}
+    finishing = [[] for _ in order]
+    keep = [set() for _ in order]
+    for check in checks:
+        last = max(step[slot] for slot in check[2])
+        finishing[last].append(check)
+        for slot in check[2]:
+            for i in range(step[slot], last):
+                keep[i].add(step[slot])
+    keep = [sorted(needed) for needed in keep]
+    edgeValues = sorted({value for _, faces in kinds for face in faces for value in face})
+
+    def weight(check: tuple, values: tuple) -> int:
+        position, slots, _ = check
+        if position is None:
+            x, y, edge = slots
+            return 0 if values[step[edge]] in specials and values[step[x]] == values[step[y]] else 1
+        isEmpty = values[step[position]]
+        faces = [tuple(values[step[slot]] for slot in face) for face in slots]
+        return sum(1 for kindEmpty, legal in kinds if kindEmpty == isEmpty and all(face in legal for face in faces))
+
+    memo = {}
+    def count(values: tuple) -> int:
+        i = len(values)
+        if i == len(order):
+            return 1
+        key = (i,) + tuple(values[j] for j in keep[i - 1]) if i else (0,)
+        if key in memo:
+            return memo[key]
+        total = 0
+        for value in ((0, 1) if order[i] < 6 else edgeValues):
+            nextValues = values + (value,)
+            factor = 1
+            for check in finishing[i]:
+                factor *= weight(check, nextValues)
+                if not factor:
+                    break
+            if factor:
+                total += factor * count(nextValues)
+        memo[key] = total
+        return total
+    return count(())
+
+def count_cubes(facekinds: list) -> int:
+    # how many cubes enumerateCubes would return, without building any: by Burnside's lemma, the average
+    # over the 24 rotations of how many legal labelled cubes each one leaves unchanged
+    facekinds = uniqueKinds(facekinds)
+    specials = {edge.value for edge in rulesetOf(facekinds).specialEdges()}
+    fixed = countLabelled(faceTiles(facekinds), specials)
+    kinds = kindSides(facekinds)
+    for turn in ORIENTATIONS[1:]:
+        fixed += countFixed(turn, kinds, specials)
+    return fixed // 24
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print every distinct armor block that can be built from the face kinds.")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes to spread the enumeration over")
+    parser.add_argument("--count", action="store_true", help="only print how many blocks there are, without building them")
+    parser.add_argument("--engine", choices=("orderly", "search", "staged"), default="orderly", help="which enumeration to run")
+    parser.add_argument("--profile", action="store_true", help="print per-stage counters and timings as JSON to stderr when done")
+    parser.add_argument("--output", metavar="FILE", help="write the blocks to FILE as a binary catalog (see Catalog) instead of printing them")
+    parser.add_argument("--no-cache", action="store_true", help="always enumerate, instead of loading the orderly catalog from CUBES_CACHE_DIR")
+    parser.add_argument("--no-specialtri", action="store_true", help="build under the ruleset without SPECIALTRI edges")
+    parser.add_argument("--sweep", action="store_true", help="only print how many blocks there are under each ruleset, from one shared run")
+    parser.add_argument("--serve", metavar="SOCKET", help="keep the catalog in memory and answer queries on this Unix socket (see CatalogServer)")
+    parser.add_argument("--port", type=int, help="like --serve, but on this localhost TCP port")
+    args = parser.parse_args()
+    if args.profile and args.jobs > 1:
+        parser.error("--profile only sees this process, so it needs --jobs 1")
+    if args.engine != "orderly" and args.jobs > 1:
+        parser.error("only --engine orderly runs in more than one process, so --engine %s needs --jobs 1" % args.engine)
+
+    kindClasses = [Empty, Triangle, Square]
+    facekinds = Ruleset(specialTri=not args.no_specialtri).kinds(kindClasses)
+
+    if args.serve or args.port:
+        serveCatalog(facekinds, args.serve, args.port, args.jobs)
+        sys.exit()
+
+    if args.sweep:
+        for ruleset, catalog in sweepRulesets(kindClasses, [Ruleset(True), Ruleset(False)], args.jobs).items():
+            print(ruleset, len(catalog))
+        sys.exit()
+
+    profile = Profile()
+    if args.profile:
+        profile.begin()
+
+    if args.count:
+        print(count_cubes(facekinds))
+    else:
+        if args.engine == "staged":
+            cubes = stagedCubes(facekinds)
+        elif args.engine == "orderly" and not (args.no_cache or args.profile):
+            cubes = cachedCubes(facekinds, args.jobs)
+        else:
+            cubes = iter_cubes(facekinds, args.engine == "orderly", args.jobs)
+        if args.output:
+            print(writeCatalog(args.output, cubes))
+        else:
+            cubeCount = 0
+            for cube in cubes:
+                cubeCount += 1
+                cube = cube.to_cube()
+                print()
+                print(cube.bottom.facekind, cube.back.facekind, cube.left.facekind, cube.front.facekind, cube.right.facekind, cube.top.facekind)
+                # print(cube.bottom.a, cube.bottom.b, cube.bottom.d, cube.bottom.c)
+                # print(cube.back.b)
+                # print(cube.left.b)
+                # print(cube.front.c)
+                # print(cube.right.c)
+                # print(cube.top.a, cube.top.b, cube.top.d, cube.top.c)
+                print(cube.bottomBackEdge, cube.bottomLeftEdge, cube.bottomFrontEdge, cube.bottomRightEdge)
+                print(cube.backLeftEdge)
+                print(cube.frontLeftEdge)
+                print(cube.frontRightEdge)
+                print(cube.backRightEdge)
+                print(cube.topBackEdge, cube.topLeftEdge, cube.topFrontEdge, cube.topRightEdge)
+            print(cubeCount)
+
+    if args.profile:
+        profile.end()
+        print(profile.to_json(), file=sys.stderr)
     
     #TODO: should I legalize the inverse of the 2 triangle 4 void blocks? solution should be to give squares the SPECIALTRI rules like voids
     #TODO: or, remove SPECIALTRI?
\ No newline at end of file
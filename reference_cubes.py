@@ -0,0 +1,322 @@
+import copy
+
+from cubes import Empty, Round, Square, Triangle
+
+# the frozen reference verify_cubes.py checks the fast engines in cubes.py against: the Face and Cube classes,
+# rotation methods, __eq__ based cullCubes, recursiveEdgeCheck and layer by layer pipeline __main__ used to run,
+# copied as they were (side letters included); only the face kinds (their budget, orientationCheck and ruleset)
+# come from cubes.py, so leave this file slow and simple
+
+# the kinds this pipeline can build: it checks faces with orientationCheck while they are still missing sides,
+# which the half kinds' checks don't allow, as they were only stubs back then
+KINDS = (Empty, Triangle, Square, Round)
+
+class Face():
+    def __init__(self, facekind)-> None:
+        self.facekind = facekind
+        # a
+        #b c
+        # d
+        self.a = None
+        self.b = None
+        self.c = None
+        self.d = None
+        self.remainingBudget = self.facekind.budget.copy()
+    def __str__(self) -> str:
+        return str(self.facekind)
+    def __repr__(self) -> str:
+        # for checking out lists from the cubes
+        return str(self.facekind)
+    # need to define an eq that works through rotation
+    def __eq__(self, obj: object) -> bool:
+        if (type(self) != type(obj)):
+            return False
+        if self.facekind != obj.facekind:
+            return False
+        if self.remainingBudget != obj.remainingBudget:
+            return False
+        return True
+    def __ne__(self, obj: object) -> bool:
+        return not self == obj
+    def isOrientationOk(self) -> bool:
+        return self.facekind.orientationCheck(self.a, self.b, self.c, self.d)
+
+class Cube():
+    def __init__(self, top:Face=None, bottom:Face=None, front:Face=None, back:Face=None, left:Face=None, right:Face=None) -> None:
+        self.top = top
+        self.bottom = bottom
+        self.front = front
+        self.back = back
+        self.left = left
+        self.right = right
+
+        self.topBackEdge = None
+        self.topLeftEdge = None
+        self.topFrontEdge = None
+        self.topRightEdge = None
+
+        self.backLeftEdge = None
+        self.frontLeftEdge = None
+        self.frontRightEdge = None
+        self.backRightEdge = None
+
+        self.bottomBackEdge = None
+        self.bottomLeftEdge = None
+        self.bottomFrontEdge = None
+        self.bottomRightEdge = None
+
+    def __eq__(self, obj: object) -> bool:
+        for cube in [obj, obj.bottom_to_top(), obj.front_to_top(), obj.back_to_top(), obj.left_to_top(), obj.right_to_top()]:
+            for rota in [cube, cube.rotate_top_face_90(), cube.rotate_top_face_90().rotate_top_face_90(), cube.rotate_top_face_90().rotate_top_face_90().rotate_top_face_90()]:
+                if self.get_face_list() == rota.get_face_list() and self.get_edge_list() == rota.get_edge_list():
+                    return True
+        return False
+    def __ne__(self, obj: object) -> bool:
+        return not self == obj
+    def get_face_list(self) -> list:
+        return [self.top, self.bottom, self.front, self.back, self.left, self.right]
+    def get_edge_list(self) -> list:
+        return [self.topBackEdge, self.topLeftEdge, self.topFrontEdge, self.topRightEdge, self.backLeftEdge, self.backRightEdge, self.frontLeftEdge, self.frontRightEdge,
+                self.bottomBackEdge, self.bottomLeftEdge, self.bottomFrontEdge, self.bottomRightEdge]
+    def rotate_top_face_90(self):
+        # clockwise rotation
+        cube = Cube(self.top, self.bottom, self.right, self.left, self.front, self.back)
+
+        cube.topBackEdge = self.topLeftEdge
+        cube.topLeftEdge = self.topFrontEdge
+        cube.topFrontEdge = self.topRightEdge
+        cube.topRightEdge = self.topBackEdge
+
+        cube.backLeftEdge = self.frontLeftEdge
+        cube.frontLeftEdge = self.frontRightEdge
+        cube.frontRightEdge = self.backRightEdge
+        cube.backRightEdge = self.backLeftEdge
+
+        cube.bottomBackEdge = self.bottomLeftEdge
+        cube.bottomLeftEdge = self.bottomFrontEdge
+        cube.bottomFrontEdge = self.bottomRightEdge
+        cube.bottomRightEdge = self.bottomBackEdge
+
+        return cube
+    def bottom_to_top(self):
+        cube = Cube(self.bottom, self.top, self.back, self.front, self.left, self.right)
+
+        cube.topBackEdge = self.bottomFrontEdge
+        cube.topLeftEdge = self.bottomLeftEdge
+        cube.topFrontEdge = self.bottomBackEdge
+        cube.topRightEdge = self.bottomRightEdge
+
+        cube.backLeftEdge = self.frontLeftEdge
+        cube.frontLeftEdge = self.backLeftEdge
+        cube.frontRightEdge = self.backRightEdge
+        cube.backRightEdge = self.frontRightEdge
+
+        cube.bottomBackEdge = self.topFrontEdge
+        cube.bottomLeftEdge = self.topLeftEdge
+        cube.bottomFrontEdge = self.topBackEdge
+        cube.bottomRightEdge = self.topRightEdge
+
+        return cube
+    def front_to_top(self):
+        cube = Cube(self.front, self.back, self.bottom, self.top, self.left, self.right)
+
+        cube.topBackEdge = self.topFrontEdge
+        cube.topLeftEdge = self.frontLeftEdge
+        cube.topFrontEdge = self.bottomFrontEdge
+        cube.topRightEdge = self.frontRightEdge
+
+        cube.backLeftEdge = self.topLeftEdge
+        cube.frontLeftEdge = self.bottomLeftEdge
+        cube.frontRightEdge = self.bottomRightEdge
+        cube.backRightEdge = self.topRightEdge
+
+        cube.bottomBackEdge = self.topBackEdge
+        cube.bottomLeftEdge = self.backLeftEdge
+        cube.bottomFrontEdge = self.bottomBackEdge
+        cube.bottomRightEdge = self.backRightEdge
+
+        return cube
+    def back_to_top(self):
+        cube = Cube(self.back, self.front, self.top, self.bottom, self.left, self.right)
+
+        cube.topBackEdge = self.bottomBackEdge
+        cube.topLeftEdge = self.backLeftEdge
+        cube.topFrontEdge = self.topBackEdge
+        cube.topRightEdge = self.backRightEdge
+
+        cube.backLeftEdge = self.bottomLeftEdge
+        cube.frontLeftEdge = self.topLeftEdge
+        cube.frontRightEdge = self.topRightEdge
+        cube.backRightEdge = self.bottomRightEdge
+
+        cube.bottomBackEdge = self.bottomFrontEdge
+        cube.bottomLeftEdge = self.frontLeftEdge
+        cube.bottomFrontEdge = self.topFrontEdge
+        cube.bottomRightEdge = self.frontRightEdge
+
+        return cube
+    def left_to_top(self):
+        cube = Cube(self.left, self.right, self.front, self.back, self.bottom, self.top)
+
+        cube.topBackEdge = self.backLeftEdge
+        cube.topLeftEdge = self.bottomLeftEdge
+        cube.topFrontEdge = self.frontLeftEdge
+        cube.topRightEdge = self.topLeftEdge
+
+        cube.backLeftEdge = self.bottomBackEdge
+        cube.frontLeftEdge = self.bottomFrontEdge
+        cube.frontRightEdge = self.topFrontEdge
+        cube.backRightEdge = self.topBackEdge
+
+        cube.bottomBackEdge = self.backRightEdge
+        cube.bottomLeftEdge = self.bottomRightEdge
+        cube.bottomFrontEdge = self.frontRightEdge
+        cube.bottomRightEdge = self.topRightEdge
+
+        return cube
+    def right_to_top(self):
+        cube = Cube(self.right, self.left, self.front, self.back, self.top, self.bottom)
+
+        cube.topBackEdge = self.backRightEdge
+        cube.topLeftEdge = self.topRightEdge
+        cube.topFrontEdge = self.frontRightEdge
+        cube.topRightEdge = self.bottomRightEdge
+
+        cube.backLeftEdge = self.topBackEdge
+        cube.frontLeftEdge = self.topFrontEdge
+        cube.frontRightEdge = self.bottomFrontEdge
+        cube.backRightEdge = self.bottomBackEdge
+
+        cube.bottomBackEdge = self.backLeftEdge
+        cube.bottomLeftEdge = self.topLeftEdge
+        cube.bottomFrontEdge = self.frontLeftEdge
+        cube.bottomRightEdge = self.bottomLeftEdge
+
+        return cube
+    def areFacesValid(self) -> bool:
+        okFaceCount = 0
+        for face in self.get_face_list():
+            if face and face.isOrientationOk():
+                okFaceCount += 1
+            elif face is None:
+                okFaceCount += 1
+        return okFaceCount == 6
+    def addEdge(self, faces: tuple, edge) -> None:
+        if ("top" in faces):
+            if ("back" in faces):
+                self.topBackEdge = edge
+            elif ("left" in faces):
+                self.topLeftEdge = edge
+            elif ("front" in faces):
+                self.topFrontEdge = edge
+            elif ("right" in faces):
+                self.topRightEdge = edge
+        elif ("bottom" in faces):
+            if ("back" in faces):
+                self.bottomBackEdge = edge
+            elif ("left" in faces):
+                self.bottomLeftEdge = edge
+            elif ("front" in faces):
+                self.bottomFrontEdge = edge
+            elif ("right" in faces):
+                self.bottomRightEdge = edge
+        elif ("back" in faces):
+            if ("left" in faces):
+                self.backLeftEdge = edge
+            elif ("right" in faces):
+                self.backRightEdge = edge
+        elif ("front" in faces):
+            if ("left" in faces):
+                self.frontLeftEdge = edge
+            elif ("right" in faces):
+                self.frontRightEdge = edge
+
+def cullCubes(cubeList: list) -> list:
+    tempCubes = []
+    for cube in cubeList:
+        flag = False
+        for reverseCube in tempCubes:
+            if cube == reverseCube:
+                flag = True
+        if not flag:
+            tempCubes.append(cube)
+    return tempCubes
+
+def recursiveEdgeCheck(cube: Cube, newestFace: str, connectedFaces: list):
+    validCubes = []
+    # connectedFaces must be a list of tuples containing 3 elements: the X side, the X side's target edge, and the Y side's target edge, all strings
+    cubeNewestFace = getattr(cube, newestFace)
+    connectedFacesCopy = copy.deepcopy(connectedFaces)
+    targetTuple = connectedFacesCopy.pop(0)
+    cubeTargetFace = getattr(cube, targetTuple[0])
+    sharedBudget = list(set(cubeTargetFace.remainingBudget) & set(cubeNewestFace.remainingBudget))
+    # SPECIALTRI_IS_LEGAL was a module flag then; the face kinds carry it in their ruleset now
+    specialChecks = ["SPECIALFULL"]
+    if cubeNewestFace.facekind.ruleset.specialTri:
+        specialChecks.append("SPECIALTRI")
+    for specialEdge in specialChecks:
+        if specialEdge in [edge.name for edge in sharedBudget] and (Empty() not in (cubeNewestFace.facekind, cubeTargetFace.facekind) or cubeNewestFace.facekind == cubeTargetFace.facekind):
+            sharedBudget = [i for i in sharedBudget if i.name != specialEdge]
+    for edge in sharedBudget:
+        nextCube = copy.deepcopy(cube)
+        nextCubeNewestFace = getattr(nextCube, newestFace)
+        nextCubeTargetFace = getattr(nextCube, targetTuple[0])
+        nextCube.addEdge((newestFace, targetTuple[0]), edge)
+        #nextCubeTargetFace.x = edge
+        setattr(nextCubeTargetFace, targetTuple[1], edge)
+        nextCubeTargetFace.remainingBudget.remove(edge)
+        #nextCubeNewestFace.y = edge
+        setattr(nextCubeNewestFace, targetTuple[2], edge)
+        nextCubeNewestFace.remainingBudget.remove(edge)
+
+        # check and append cube, or recur
+        if connectedFacesCopy:
+            # recur
+            validCubes.extend(recursiveEdgeCheck(nextCube, newestFace, connectedFacesCopy))
+        else:
+            # check and append if valid
+            if nextCube.areFacesValid():
+                validCubes.append(nextCube)
+    return validCubes
+
+# __main__'s layers after the bottom, with the side letters it used
+LAYERS = (("back", [("bottom", "a", "d")]),
+          ("left", [("bottom", "b", "d"), ("back", "b", "c")]),
+          ("front", [("bottom", "d", "d"), ("left", "b", "b")]),
+          ("right", [("bottom", "c", "d"), ("front", "c", "b"), ("back", "c", "c")]),
+          ("top", [("back", "a", "a"), ("left", "a", "b"), ("front", "a", "d"), ("right", "a", "c")]))
+
+def referenceCubes(facekinds: list) -> list:
+    # every distinct cube buildable from facekinds, as __main__ built them
+    cubeList = []
+    for face in facekinds:
+        cube = Cube()
+        cube.bottom = Face(face)
+        cubeList.append(cube)
+    for newestFace, connectedFaces in LAYERS:
+        nextCubes = []
+        for face in facekinds:
+            for cube in cubeList:
+                modCube = copy.deepcopy(cube)
+                setattr(modCube, newestFace, Face(face))
+                nextCubes.extend(recursiveEdgeCheck(modCube, newestFace, connectedFaces))
+        cubeList = cullCubes(nextCubes)
+    return cubeList
+
+def orientations(cube: Cube) -> list:
+    # the 24 ways of holding a cube, turned the way __eq__ turns it
+    turned = []
+    for faceUp in [cube, cube.bottom_to_top(), cube.front_to_top(), cube.back_to_top(), cube.left_to_top(), cube.right_to_top()]:
+        for _ in range(4):
+            turned.append(faceUp)
+            faceUp = faceUp.rotate_top_face_90()
+    return turned
+
+def referenceKeys(facekinds: list) -> set:
+    # the catalog as the smallest (kind_ids, Edge values) encoding of each cube over its orientations,
+    # the same key cubes.py gives its cubes, so the two catalogs compare as sets
+    keys = set()
+    for cube in referenceCubes(facekinds):
+        keys.add(min(tuple(face.facekind.kind_id for face in rota.get_face_list()) + tuple(edge.value for edge in rota.get_edge_list())
+                     for rota in orientations(cube)))
+    return keys
@@ -0,0 +1,226 @@
+from collections import Counter
+import asyncio
+import json
+import os
+import random
+
+import pytest
+
+import cubes
+
+KINDS = [cubes.Empty, cubes.Triangle, cubes.Square, cubes.Round, cubes.TipLeft]
+
+@pytest.fixture(scope="module")
+def index():
+    return cubes.CatalogIndex(cubes.enumerateCubes(cubes.Ruleset().kinds(KINDS)))
+
+def scan(index, faces={}, edges={}, kinds={}, multiset=None, rotated=False) -> list:
+    # CatalogIndex.query the slow way: look at every record in every orientation it may be held in
+    def matches(code):
+        return (all(code[position] in ids for position, ids in faces.items())
+                and all(code[6 + edgeIndex] in values for edgeIndex, values in edges.items()))
+    found = []
+    for number, code in enumerate(index.codes):
+        counts = Counter(code[:6])
+        if any(counts[kindId] != n for kindId, n in kinds.items()):
+            continue
+        if multiset is not None and sorted(code[:6]) != sorted(multiset):
+            continue
+        turned = [getter(code) for getter in cubes.ORIENTATION_GETTERS] if rotated else [code]
+        if any(matches(code) for code in turned):
+            found.append(number)
+    return found
+
+def test_zero_counts(index):
+    assert len(index) == 226
+    assert len(index.query(kinds={cubes.Round: 0})) == 57
+    assert len(index.query(kinds={cubes.TipLeft: 0})) == 102
+    # a kind the catalog was not built with is on no block
+    assert index.query(kinds={cubes.BaseLeft: 0}) == list(range(len(index)))
+    assert index.query(kinds={cubes.BaseLeft: 1}) == []
+
+def test_query_matches_scan(index):
+    rng = random.Random(0)
+    # kind_ids work anywhere query takes a kind; BaseLeft is not in the catalog
+    kindIds = [kind.kind_id for kind in KINDS + [cubes.BaseLeft]]
+    for _ in range(300):
+        faces = {position: set(rng.sample(kindIds, rng.randint(1, 2))) for position in rng.sample(range(6), rng.randint(0, 2))}
+        edges = {edgeIndex: set(rng.sample(range(len(cubes.Edge)), rng.randint(1, 3))) for edgeIndex in rng.sample(range(12), rng.randint(0, 2))}
+        kinds = {kindId: rng.randint(0, 3) for kindId in rng.sample(kindIds, rng.randint(0, 2))}
+        multiset = [rng.choice(kindIds) for _ in range(6)] if rng.random() < 0.1 else None
+        rotated = rng.random() < 0.5
+        query = index.query({position: list(ids) for position, ids in faces.items()},
+                            {edgeIndex: [cubes.Edge(value) for value in values] for edgeIndex, values in edges.items()},
+                            kinds, multiset, rotated)
+        assert query == scan(index, faces, edges, kinds, multiset, rotated)
+
+async def roundTrip(server, path: str, lines: list) -> list:
+    # send each line to server over one connection to its Unix socket, and gather the answers
+    serving = asyncio.ensure_future(server.serve(path))
+    while not os.path.exists(path):
+        await asyncio.sleep(0.01)
+    reader, writer = await asyncio.open_unix_connection(path)
+    answers = []
+    for line in lines:
+        writer.write(line.encode() + b"\n")
+        await writer.drain()
+        answers.append(json.loads(await reader.readline()))
+    writer.close()
+    serving.cancel()
+    return answers
+
+def test_server_round_trip(index, tmp_path):
+    kinds = cubes.Ruleset().kinds(KINDS)
+    server = cubes.CatalogServer(kinds, cubes.enumerateCubes(kinds))
+    lines = ['5', '[1]', '"info"', '{"op": "info"}', '{"op": "count", "faces": 5}', 'not json',
+             '{"op": "count", "kinds": {"Round": 0}}', '{"op": "lookup", "code": %s}' % json.dumps(index.codes[7])]
+    answers = asyncio.run(roundTrip(server, str(tmp_path / "cubes.sock"), lines))
+    # the bad requests are answered with an error, and the connection stays open for the rest
+    assert all("error" in answer for answer in answers[:3])
+    assert answers[3]["count"] == 226
+    assert "error" in answers[4] and "error" in answers[5]
+    assert answers[6] == {"count": 57}
+    assert answers[7]["record"] == 7
+
+def test_server_checks_arguments(index, tmp_path):
+    kinds = cubes.Ruleset().kinds(KINDS)
+    server = cubes.CatalogServer(kinds, cubes.enumerateCubes(kinds))
+    code = list(index.codes[3])
+    bad = ['{"op": "symmetry", "record": -1}', '{"op": "symmetry", "record": 226}', '{"op": "orientations", "record": -1}',
+           '{"op": "orientations", "record": true}', '{"op": "symmetry", "record": "3"}',
+           '{"op": "lookup", "code": %s}' % json.dumps(code + [0, 0]), '{"op": "lookup", "code": %s}' % json.dumps(code[:5]),
+           '{"op": "lookup", "code": %s}' % json.dumps(code[:17] + [1.5]),
+           '{"op": "query", "limit": -2}', '{"op": "query", "limit": "all"}']
+    good = ['{"op": "symmetry", "record": 225}', '{"op": "query", "kinds": {"Round": 0}, "limit": 2}']
+    answers = asyncio.run(roundTrip(server, str(tmp_path / "cubes.sock"), bad + good))
+    assert all("error" in answer for answer in answers[:len(bad)])
+    assert answers[len(bad)] == index.symmetry(225)
+    assert answers[len(bad) + 1]["count"] == 57 and len(answers[len(bad) + 1]["records"]) == 2
+    with pytest.raises(IndexError):
+        index.symmetry(-1)
+
+def test_catalog_round_trip(tmp_path):
+    kinds = cubes.Ruleset().kinds(KINDS)
+    catalog = cubes.enumerateCubes(kinds)
+    path = str(tmp_path / "kinds.cat")
+    assert cubes.writeCatalog(path, catalog) == 226
+    with cubes.Catalog(path) as loaded:
+        assert len(loaded) == 226
+        assert bytes(loaded[5]) == bytes(catalog[5].encode())
+        assert [cube.encode() for cube in loaded.cubes(kinds)] == [cube.encode() for cube in catalog]
+    # an unfinished cube fails the write and leaves neither a catalog nor a temp file behind
+    with pytest.raises(ValueError, match="finished"):
+        cubes.writeCatalog(str(tmp_path / "partial.cat"), catalog[:3] + [cubes.CubeState().with_face("bottom", kinds[0])])
+    assert os.listdir(tmp_path) == ["kinds.cat"]
+    # and anything that is not a whole catalog is refused on the way in
+    with open(path, "rb") as f:
+        whole = f.read()
+    for data in (b"", b"CUBCAT", whole[:-5], b"x" * 100):
+        with open(path, "wb") as f:
+            f.write(data)
+        with pytest.raises(ValueError):
+            cubes.Catalog(path)
+
+def test_bad_cache_file_is_a_miss(tmp_path):
+    kinds = cubes.Ruleset().kinds(KINDS)
+    expected = [cube.encode() for cube in cubes.enumerateCubes(kinds)]
+    path = tmp_path / (cubes.catalogKey(kinds) + ".cat")
+    older = tmp_path / (cubes.catalogKey(kinds[:-1]) + ".cat")
+    for data in (b"", b"CUBCAT", b"x" * 100):
+        # a bad file for the catalog itself and for the one it would be grown from
+        path.write_bytes(data)
+        older.write_bytes(data)
+        assert [cube.encode() for cube in cubes.cachedCubes(kinds, cacheDir=str(tmp_path))] == expected
+        # and the bad file was replaced with the real catalog
+        with cubes.Catalog(str(path)) as catalog:
+            assert len(catalog) == len(expected)
+
+def test_one_ruleset_at_a_time():
+    mixed = [cubes.Empty(cubes.Ruleset(False)), cubes.Triangle(cubes.Ruleset(True))]
+    for build in (cubes.enumerateCubes, lambda kinds: cubes.enumerateCubes(kinds, orderly=False), cubes.stagedCubes,
+                  lambda kinds: cubes.extendCatalog(cubes.enumerateCubes(kinds[:1]), kinds[:1], kinds[1]),
+                  lambda kinds: cubes.sweepTask((kinds, None))):
+        with pytest.raises(ValueError, match="rulesets"):
+            build(mixed)
+
+def slowValid(code: tuple, facekinds: list) -> bool:
+    # BatchValidator.validate for one encoding, from legalSides and sharedEdgeRule
+    byId = {facekind.kind_id: facekind for facekind in facekinds}
+    for position, kindId in enumerate(code[:6]):
+        if kindId == -1:
+            continue
+        if kindId not in byId:
+            return False
+        sides = tuple(None if code[6 + i] == -1 else cubes.Edge(code[6 + i]) for i in cubes.FACE_SIDES[position])
+        if sides not in byId[kindId].legalSides():
+            return False
+    for edgeIndex, (x, y) in enumerate(cubes.EDGE_FACES):
+        if -1 in (code[6 + edgeIndex], code[x], code[y]):
+            continue
+        a, b = byId[code[x]], byId[code[y]]
+        if cubes.Edge(code[6 + edgeIndex]) not in cubes.sharedEdgeRule(a, cubes.budgetCounts(a), b, cubes.budgetCounts(b)):
+            return False
+    return True
+
+@pytest.mark.parametrize("specialTri", [True, False])
+def test_batch_validate_matches_slow(specialTri):
+    numpy = pytest.importorskip("numpy")
+    # partial cubes cut out of a catalog with kinds the validator was not built for, some with one slot changed
+    catalog = cubes.enumerateCubes(cubes.Ruleset(specialTri).kinds(KINDS + [cubes.TipRight, cubes.HalfSquare]))
+    facekinds = cubes.Ruleset(specialTri).kinds(KINDS)
+    rng = random.Random(1)
+    codes = []
+    for _ in range(5000):
+        code = list(rng.choice(catalog).encode())
+        for slot in rng.sample(range(18), rng.randint(0, 12)):
+            code[slot] = -1
+        if rng.random() < 0.3:
+            slot = rng.randrange(18)
+            code[slot] = rng.choice([-1, 11, 12] + list(range(len(cubes.Edge)))) if slot < 6 else rng.randrange(-1, len(cubes.Edge))
+        codes.append(tuple(code))
+    codes = numpy.array(codes)
+    mask = cubes.BatchValidator(facekinds).validate(codes[:, :6], codes[:, 6:])
+    assert mask.tolist() == [slowValid(tuple(code), facekinds) for code in codes.tolist()]
+    assert 0 < mask.sum() < len(codes)
+
+@pytest.mark.parametrize("specialTri", [True, False])
+def test_batch_staged_matches_staged(specialTri):
+    pytest.importorskip("numpy")
+    for kindClasses in ([], [cubes.Empty], KINDS, [cubes.Square, cubes.BaseLeft, cubes.BaseRight],
+                        [cubes.Empty, cubes.HalfSquare, cubes.HalfTriangle, cubes.InvertedHalfTriangle], [cubes.TipRight, cubes.Round, cubes.Empty]):
+        facekinds = cubes.Ruleset(specialTri).kinds(kindClasses)
+        assert [cube.encode() for cube in cubes.stagedCubes(facekinds, batch=True)] == [cube.encode() for cube in cubes.stagedCubes(facekinds)]
+
+def test_neighbour_table(index):
+    table = cubes.NeighbourTable(index.codes)
+    pairs = list(table.pairs())
+    # every fit once, with each block held only in orientations that look different
+    assert len(pairs) == len(table) == len(set(pairs)) == 534126
+    placements = sorted({placement for pair in pairs for placement in pair})
+    turned = [cubes.ORIENTATION_GETTERS[turn](index.codes[number]) for number, turn in placements]
+    assert len(set(turned)) == len(turned)
+    # all pairs the slow way for some of the blocks on the left: b's left face, seen from a's side, is a's right face
+    placed = {}
+    for number, code in enumerate(index.codes):
+        for turn, getter in enumerate(cubes.ORIENTATION_GETTERS):
+            placed.setdefault(getter(code), (number, turn))
+    rng = random.Random(2)
+    for code in rng.sample(sorted(placed), 40):
+        right = cubes.faceSignature(code, 5)
+        fits = sorted(placed[other] for other in placed if cubes.mirrorSignature(cubes.faceSignature(other, 4)) == right)
+        assert sorted(table.neighbours(*placed[code])) == fits
+
+def test_symmetry(index):
+    kinds = cubes.Ruleset().kinds(KINDS)
+    for number, code in enumerate(index.codes):
+        assert cubes.mirrorCode(cubes.mirrorCode(code)) == code
+        twin = index.twins[number]
+        # the mirror image needs TipRight, which the catalog lacks, exactly when the block has a TipLeft face
+        assert (twin is None) == (cubes.TipLeft.kind_id in code[:6])
+        if twin is not None:
+            assert index.twins[twin] == number
+            assert index.symmetry(number)["chiral"] == (twin != number)
+    assert any(twin not in (None, number) for number, twin in enumerate(index.twins))
+    # each block stands for 24 // stabilizer labelled cubes
+    specials = {edge.value for edge in cubes.rulesetOf(kinds).specialEdges()}
+    assert sum(24 // stabilizer for stabilizer in index.stabilizers) == cubes.countLabelled(cubes.faceTiles(kinds), specials)
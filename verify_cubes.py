@@ -0,0 +1,154 @@
+from itertools import combinations
+from time import perf_counter
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+
+import cubes
+import reference_cubes
+
+# only the kinds the frozen pipeline can build
+KIND_ORDER = tuple(kind.__name__ for kind in reference_cubes.KINDS)
+# the rest have no reference, so the engines are only checked against each other on them
+HALF_KINDS = ("TipLeft", "TipRight", "HalfSquare", "BaseLeft", "BaseRight", "HalfTriangle", "InvertedHalfTriangle")
+
+def keys(cubeList) -> set:
+    return {cube.canonical_key() for cube in cubeList}
+
+def extended(facekinds: list) -> set:
+    # the catalog grown one kind at a time from the first
+    catalog = cubes.enumerateCubes(facekinds[:1])
+    for i in range(1, len(facekinds)):
+        catalog = cubes.extendCatalog(catalog, facekinds[:i], facekinds[i])
+    return keys(catalog)
+
+def swept(facekinds: list) -> set:
+    # this ruleset's catalog out of a sweep over both rulesets
+    ruleset = cubes.rulesetOf(facekinds)
+    catalogs = cubes.sweepRulesets([type(facekind) for facekind in facekinds], [ruleset, cubes.Ruleset(not ruleset.specialTri)])
+    return keys(catalogs[ruleset])
+
+# each engine gives the canonical keys of its catalog, or for count just how many there are
+ENGINES = {"staged": lambda facekinds: keys(cubes.stagedCubes(facekinds)),
+           "search": lambda facekinds: keys(cubes.enumerateCubes(facekinds, orderly=False)),
+           "orderly": lambda facekinds: keys(cubes.enumerateCubes(facekinds)),
+           "parallel": lambda facekinds: keys(cubes.enumerateCubes(facekinds, jobs=2)),
+           "extend": extended,
+           "sweep": swept,
+           "count": cubes.count_cubes}
+if cubes.numpy is not None:
+    ENGINES["staged-batch"] = lambda facekinds: keys(cubes.stagedCubes(facekinds, batch=True))
+
+def measure(func, facekinds: list) -> tuple:
+    # the result, wall time of an untraced run, and tracemalloc peak of a second run
+    start = perf_counter()
+    result = func(facekinds)
+    seconds = perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    func(facekinds)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def agrees(result, reference: set) -> bool:
+    if isinstance(result, int):
+        return result == len(reference)
+    return result == reference
+
+def makeKinds(names: tuple, specialTri: bool) -> list:
+    # fresh face kinds for every run, so no engine sees tables another one compiled
+    return cubes.Ruleset(specialTri).kinds([getattr(cubes, name) for name in names])
+
+def fails(engine: str, names: tuple, specialTri: bool) -> bool:
+    reference = reference_cubes.referenceKeys(makeKinds(names, specialTri))
+    return not agrees(ENGINES[engine](makeKinds(names, specialTri)), reference)
+
+def shrink(engine: str, names: tuple, specialTri: bool) -> tuple:
+    # drop kinds one at a time for as long as the engine still disagrees, leaving an input where dropping any
+    # one more kind makes it agree again
+    shrunk = True
+    while shrunk and len(names) > 1:
+        shrunk = False
+        for i in range(len(names)):
+            smaller = names[:i] + names[i + 1:]
+            if fails(engine, smaller, specialTri):
+                names = smaller
+                shrunk = True
+                break
+    return names
+
+def inputs(exhaustive: int, randomCount: int, randomSizes: tuple, seed: int) -> list:
+    # every kind subset up to exhaustive kinds, then randomCount random ones, shuffled, of randomSizes kinds
+    names = [subset for size in range(1, exhaustive + 1) for subset in combinations(KIND_ORDER, size)]
+    rng = random.Random(seed)
+    for _ in range(randomCount):
+        subset = rng.sample(KIND_ORDER, rng.randint(*randomSizes))
+        names.append(tuple(subset))
+    return names
+
+def verify(subsets: list, engines: list) -> list:
+    failures = []
+    for specialTri in (True, False):
+        for names in subsets:
+            reference, refSeconds, refPeak = measure(reference_cubes.referenceKeys, makeKinds(names, specialTri))
+            for engine in engines:
+                result, seconds, peak = measure(ENGINES[engine], makeKinds(names, specialTri))
+                ok = agrees(result, reference)
+                print("specialtri=%-5s %-70s %-12s %-8s %8.1fx time %8.2fx memory" % (specialTri, ",".join(names), engine,
+                      "ok" if ok else "MISMATCH", refSeconds / max(seconds, 1e-9), refPeak / max(peak, 1)))
+                if not ok:
+                    failures.append((engine, names, specialTri))
+    return failures
+
+def crossInputs(count: int, sizes: tuple, seed: int) -> list:
+    # count random subsets of sizes kinds, shuffled, each with at least one half kind
+    rng = random.Random(seed)
+    subsets = []
+    for _ in range(count):
+        first = rng.choice(HALF_KINDS)
+        rest = [name for name in KIND_ORDER + HALF_KINDS if name != first]
+        subset = [first] + rng.sample(rest, rng.randint(*sizes) - 1)
+        rng.shuffle(subset)
+        subsets.append(tuple(subset))
+    return subsets
+
+def crossCheck(subsets: list, engines: list) -> list:
+    # each engine against the staged build, the one closest to the reference pipeline
+    failures = []
+    for specialTri in (True, False):
+        for names in subsets:
+            expected = ENGINES["staged"](makeKinds(names, specialTri))
+            for engine in engines:
+                if engine == "staged":
+                    continue
+                start = perf_counter()
+                ok = agrees(ENGINES[engine](makeKinds(names, specialTri)), expected)
+                print("specialtri=%-5s %-70s %-12s %-8s %8.2fs against staged" % (specialTri, ",".join(names), engine,
+                      "ok" if ok else "MISMATCH", perf_counter() - start))
+                if not ok:
+                    failures.append((engine, names, specialTri))
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the fast engines against the frozen reference pipeline and measure how much faster they are.")
+    parser.add_argument("--exhaustive", type=int, default=len(KIND_ORDER), help="check every subset of up to this many face kinds")
+    parser.add_argument("--random", type=int, default=0, help="how many random face kind subsets (reshuffled, as the exhaustive pass covers them all) to check as well")
+    parser.add_argument("--random-sizes", type=int, nargs=2, default=[2, len(KIND_ORDER)], metavar=("MIN", "MAX"), help="how many kinds a random subset has")
+    parser.add_argument("--cross", type=int, default=8, help="how many random subsets with half kinds to check the engines against each other on")
+    parser.add_argument("--cross-sizes", type=int, nargs=2, default=[2, 5], metavar=("MIN", "MAX"), help="how many kinds a cross-check subset has")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), default=sorted(ENGINES))
+    args = parser.parse_args()
+
+    failures = verify(inputs(args.exhaustive, args.random, tuple(args.random_sizes), args.seed), args.engines)
+    for engine, names, specialTri in failures:
+        print("FAILED %s specialtri=%s, smallest failing kinds: %s" % (engine, specialTri, ",".join(shrink(engine, names, specialTri))))
+    crossFailures = crossCheck(crossInputs(args.cross, tuple(args.cross_sizes), args.seed), args.engines)
+    for engine, names, specialTri in crossFailures:
+        print("FAILED %s specialtri=%s, disagrees with staged on kinds: %s" % (engine, specialTri, ",".join(names)))
+    if failures or crossFailures:
+        sys.exit(1)
+    print("all engines agree with the reference, and with each other on the half kinds")